@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Append4DTurb
+function: add unfrozen planes further upstream to an existing 4D wind field
+--------------------------------------------------------------------------------------
+Usage
+ConfigParameters = Append4DTurb(ConfigParameters,XposNew,SeedsNew)
+------------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters of the existing 4D wind field, output of
+                  the function #TurbConfig.py# (or of the function #Export4DTurb.py#)
+XposNew: -list, x positions of the new unfrozen planes, larger than ConfigParameters['Xpos']
+SeedsNew: -list, random seeds of the new unfrozen planes
+-----------------------------------------------------------------------------------
+Outputs
+ConfigParameters: -dict, configuration parameters of the extended 4D wind field
+a binary file of the extended 4D wind field (.evo), named after the last new seed
+-----------------------------------------------------------------------------------
+The Cholesky factors of the longitudinal coherence are lower triangular, so the
+unfrozen planes only depend on the 3D wind fields of the planes before them. Only the
+3D wind fields of the new planes are generated and only the new rows of the Cholesky
+factors are calculated from the cached factors of the existing planes. The Fourier
+coefficients of the existing planes are read from the files saved with
+ConfigParameters['SaveSpectra'] (see #Generate4DTurb.py#) or calculated again from the
+3D wind fields if they do not exist. The data of the existing planes is copied from
+the existing .evo file without any change.
+------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+-------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+import os
+from Execute3DSim import Execute3DSim
+from Import3DTurb import Import3DTurb
+from CalcCohx import CalcCohx
+from CalcHx import CalcHx, WriteCohxCache
+from Generate4DTurb import FFTModule, SpectrumFile
+from EvoFile import EvoWriter
+from Store3DTurb import PlanePath
+from readBLgrid import readBLgridHeader
+
+
+def Append4DTurb(ConfigParameters,XposNew,SeedsNew):
+
+    XposNew  = list(np.atleast_1d(XposNew))
+    SeedsNew = list(np.atleast_1d(SeedsNew))
+    Nold     = ConfigParameters['Nplanes']
+    Nt       = int(ConfigParameters['Nt'])
+    Ny       = ConfigParameters['Ny']
+    Nz       = ConfigParameters['Nz']
+    nf       = len(ConfigParameters['f'])
+
+    if len(XposNew) != len(SeedsNew):
+        raise ValueError('The number of new unfrozen planes should be equals to the number of new seeds.')
+    if np.any(np.diff(np.append(ConfigParameters['Xpos'][-1],XposNew)) <= 0):
+        raise ValueError('The new unfrozen planes must be upstream of the existing ones in increasing order.')
+    if len(np.unique(list(ConfigParameters['Seeds'])+SeedsNew)) != Nold+len(SeedsNew):
+        raise ValueError('The seeds must not be repetitive!')
+
+    # Cholesky factors of the existing planes, read from the cache if possible
+    Hx_old,ConfigParameters = CalcHx(ConfigParameters)
+
+    # configuration of the extended 4D wind field, only the 3D wind fields of the
+    # new planes are generated
+    Ext = dict(ConfigParameters)
+    Ext['Xpos']    = list(ConfigParameters['Xpos'])+XposNew
+    Ext['Seeds']   = list(ConfigParameters['Seeds'])+SeedsNew
+    Ext['Nplanes'] = len(Ext['Xpos'])
+    Ext = Execute3DSim(Ext)
+    Nplanes = Ext['Nplanes']
+
+    # the existing 4D wind field is named after its last seed, see #Execute3DSim.py#
+    evoOld = os.path.join(Ext['saveDir_4D'],Ext['SimulationName3D'][0]+'_'+str(ConfigParameters['Seeds'][-1])+'_upstream.evo')
+    evoNew = os.path.join(Ext['saveDir_4D'],Ext['SimulationName4D']+'_upstream.evo')
+    Header = np.fromfile(evoOld,dtype=np.int16,count=Nold)
+    if Header[0] != Nold-1 or np.any(Header[1:] != np.int16(ConfigParameters['Xpos'][1:])) or \
+       os.path.getsize(evoOld) != 2*Nold+2*(Nold-1)*Nz*Ny*3*Nt:
+        raise ValueError('The file '+evoOld+' does not match the configuration of the existing 4D wind field.')
+
+    print('Appending '+str(Nplanes-Nold)+' unfrozen planes to '+os.path.basename(evoOld)+'...')
+
+    # new rows of the Cholesky factors, size: (nf,Nplanes,Nplanes)
+    Cohx,Ext = CalcCohx(Ext)
+    Hx = ExtendHx(Hx_old,np.moveaxis(Cohx,2,0))
+    if Ext.get('CohxCache',False):
+        WriteCohxCache(Ext,Hx)
+
+    dtype  = np.float32 if Ext.get('Precision','double') == 'single' else np.float64
+    fft    = FFTModule(dtype)
+    Hx_new = np.asarray(Hx[:,Nold:,:],dtype=dtype)
+
+    # 3D wind fields of the new planes
+    TurbData3D = ImportPlanes(Ext,range(Nold,Nplanes))
+
+    Components = ['U','W'] if Ext['TurbModel'] == 'Mann' else ['U']
+    TurbData4D = {"U": None,"V": TurbData3D['V'],"W": TurbData3D['W']}
+    for comp in Components:
+
+        # Fourier coefficients of all planes, size: (Ny*Nz,nf,Nplanes)
+        FC_yz = np.empty((Nz*Ny,nf,Nplanes),dtype=np.complex64 if dtype == np.float32 else np.complex128)
+        FC_yz[:,:,Nold:],data_mean = CalcSpectra(Ext,TurbData3D[comp],comp,range(Nold,Nplanes),nf)
+        missing = [i for i in range(Nold) if not os.path.isfile(SpectrumFile(Ext,i,comp))]
+        for i in range(Nold):
+            if i not in missing:
+                FC_yz[:,:,i] = np.load(SpectrumFile(Ext,i,comp),mmap_mode='r')
+        if missing:
+            print('Fourier coefficients of '+str(len(missing))+' existing planes are calculated again...')
+            FC_yz[:,:,missing],_ = CalcSpectra(Ext,ImportPlanes(Ext,missing)[comp],comp,missing,nf)
+
+        # introduce the longitudinal coherence for the new planes, the Nyquist bin is zero
+        FC_new = np.transpose(np.matmul(np.transpose(FC_yz,(1,0,2)),np.transpose(Hx_new,(0,2,1))),(1,0,2))
+        del FC_yz
+        data_xyz = np.reshape(fft.irfft(FC_new,n=2*nf,axis=1),(Nz,Ny,Nt,Nplanes-Nold))
+        TurbData4D[comp] = data_xyz if data_mean is None else data_xyz+data_mean
+        del FC_new
+
+    # binary scale and offset of the existing 4D wind field
+    if Ext.get('Backend3D','exe') == 'native' and Ext['TurbModel'] == 'Kaimal':
+        # the rotor plane written by #Export4DTurb.py#
+        Header3D = readBLgridHeader(os.path.join(Ext['saveDir_4D'],Ext['SimulationName3D'][0]+'_rotor.wnd'))
+        Scale,Offset = Header3D['Scale'],Header3D['Offset']
+    elif Ext['TurbModel'] == 'Kaimal':
+        Header3D = readBLgridHeader(PlanePath(Ext,0)+'.wnd')
+        Scale,Offset = Header3D['Scale'],Header3D['Offset']
+    else:
+        Scale,Offset = Ext['gamma']/1000*np.ones((3,1)),np.zeros((3,1))
+    Ext['binary_Scale']  = Scale
+    Ext['binary_Offset'] = Offset
+
+    # copy the existing planes and write the new planes
+    tmpName = evoNew+'.'+str(os.getpid())+'.tmp'
+    with EvoWriter(tmpName,Ext['Xpos'][1:],Ny,Nz,Nt,Scale,Offset) as Writer:
+        with open(evoOld,'rb') as fid:
+            Writer.CopyPlanes(0,fid,2*Nold,Nold-1)
+        for i in range(Nold,Nplanes):
+            Writer.WritePlane(i-1,TurbData4D['U'][:,:,:,i-Nold],TurbData4D['V'][:,:,:,i-Nold],TurbData4D['W'][:,:,:,i-Nold])
+    os.replace(tmpName,evoNew)
+
+    print('Binary file exported: '+os.path.basename(evoNew))
+    return Ext
+
+
+def ExtendHx(Hx,Cohx):
+
+    # Hx: Cholesky factors of the existing planes with size of (nf,Nold,Nold)
+    # Cohx: coherence of all planes with size of (nf,Nplanes,Nplanes)
+    # the new rows follow from the block Cholesky decomposition
+    #   [C11 C12; C21 C22] = [L11 0; L21 L22] [L11 0; L21 L22]^T
+    Nold = np.shape(Hx)[1]
+    L21  = np.transpose(np.linalg.solve(Hx,np.transpose(Cohx[:,Nold:,:Nold],(0,2,1))),(0,2,1))
+    L22  = np.linalg.cholesky(Cohx[:,Nold:,Nold:]-np.matmul(L21,np.transpose(L21,(0,2,1))))
+
+    HxExt = np.zeros(np.shape(Cohx))
+    HxExt[:,:Nold,:Nold] = Hx
+    HxExt[:,Nold:,:Nold] = L21
+    HxExt[:,Nold:,Nold:] = L22
+
+    return HxExt
+
+
+def ImportPlanes(ConfigParameters,planes):
+
+    # import the 3D wind fields of some planes as 4D arrays
+    Sub = dict(ConfigParameters)
+    Sub['Nplanes']          = len(planes)
+    Sub['SimulationName3D'] = [ConfigParameters['SimulationName3D'][i] for i in planes]
+    Sub['Seeds']            = [ConfigParameters['Seeds'][i] for i in planes]
+    Sub['Path3D']           = [PlanePath(ConfigParameters,i) for i in planes]
+    Sub['LazyImport']       = False
+    Sub['MemoryBudget']     = None
+    TurbData3D,_ = Import3DTurb(Sub)
+
+    return TurbData3D
+
+
+def CalcSpectra(ConfigParameters,data,comp,planes,nf):
+
+    # Fourier coefficients of the planes as in #Generate4DTurb.py#, size: (Ny*Nz,nf,len(planes)),
+    # the mean value is removed from the u component. They are saved if ConfigParameters['SaveSpectra'] is True
+    Nz,Ny,Nt,Np = np.shape(data)
+    data_mean = None
+    if comp == 'U':
+        data_mean = np.mean(data,axis=2,keepdims=True)
+        data = data-data_mean
+    FC_yz = FFTModule(data.dtype).rfft(np.reshape(data,(Nz*Ny,Nt,Np)),axis=1)[:,0:nf,:]
+
+    if ConfigParameters.get('SaveSpectra',False):
+        for k,i in enumerate(planes):
+            np.save(SpectrumFile(ConfigParameters,i,comp),FC_yz[:,:,k])
+
+    return FC_yz,data_mean
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark4DTurb
+function: benchmark the 4D wind field generation with synthetic 3D wind fields of any grid size
+------------------------------------------------------------------------------------
+Usage
+Run = Benchmark4DTurb(Matrix,BenchDir,TurbModels,Repeat,BaseConfig)
+Regressions = CompareBenchmark(ResultFile,Tolerance,MinTime)
+python Benchmark4DTurb.py BenchDir --Ny 8 16 --Nz 8 16 --Nt 1024 4096 --Nplanes 3 5
+-----------------------------------------------------------------------------------
+Inputs
+Matrix: -dict, the grid sizes, all combinations are run, e.g.
+        {'Ny': [8,16], 'Nz': [8,16], 'Nt': [1024,4096], 'Nplanes': [3,5]}
+BenchDir: -string, directory of the benchmark, the synthetic 3D wind fields are saved in
+          BenchDir/Data and reused by later runs
+TurbModels: -list, optional, 'Kaimal' and/or 'Mann'
+Repeat: -int, optional, number of runs of each case, the fastest one is kept
+BaseConfig: -dict, optional, configurations common to all cases, e.g. {'Precision': 'single'}
+ResultFile: -string, BenchDir/Benchmark4DTurb.jsonl
+Tolerance: -float, optional, relative increase of the wall time reported as regression
+MinTime: -float, optional, stages faster than MinTime [s] are not compared
+---------------------------------------------------------------------------------
+Outputs
+Run: -dict, appended as one line to BenchDir/Benchmark4DTurb.jsonl with the fields
+     'Time', 'Host', 'Commit', 'Versions', and 'Cases', one entry per case with the grid
+     and __['Stages'][<stage name>] = {'Wall','CPU','PeakRSS'} (see #StageTimer.py#)
+Regressions: -list, (case, stage, old wall time, new wall time) of the last run compared
+             with the previous run on the same host
+---------------------------------------------------------------------------------
+The 3D simulations are replaced with a stand-in generator (#Synthetic3DTurb#) writing
+white noise .wnd/.sum files (Kaimal, see #writeBLgrid.py#) or .bin files (Mann) of the
+configured grid, so TurbSim and MTG are not needed. The input file of each case is
+derived from the example of the matlab version (Kaimal) or written directly (Mann).
+The stages readBLgrid (Kaimal, one plane), Import3DTurb, CalcCohx, Generate4DTurb and
+Export4DTurb are timed with their sub-steps. Mann requires grid sizes of powers of 2.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import time
+from TurbConfig import TurbConfig
+from Execute3DSim import PlanSimJobs
+from Import3DTurb import Import3DTurb
+from CalcCohx import CalcCohx
+from Generate4DTurb import Generate4DTurb
+from Export4DTurb import Export4DTurb
+from StageTimer import StartTiming, StopTiming, Stage
+from readBLgrid import readBLgrid
+from writeBLgrid import writeBLgrid
+from Store3DTurb import PlanePath
+
+# example input file of TurbSim shipped with the matlab version
+TurbSimTemplate = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','evoTurb_matlab','example','TurbSimInputFileCohTest.inp')
+
+
+def Benchmark4DTurb(Matrix,BenchDir,TurbModels=('Kaimal','Mann'),Repeat=1,BaseConfig=None):
+
+    os.makedirs(BenchDir,exist_ok=True)
+    keys = ['Ny','Nz','Nt','Nplanes']
+
+    Run = {'Time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'Host': platform.node(),
+           'Commit': GitCommit(),
+           'Versions': {'python': platform.python_version(),'numpy': np.__version__},
+           'BaseConfig': BaseConfig or {},
+           'Cases': []}
+
+    for TurbModel in TurbModels:
+        for values in itertools.product(*[Matrix[k] for k in keys]):
+            Grid = dict(zip(keys,[int(v) for v in values]))
+            if TurbModel == 'Mann' and not all([math.log2(Grid[k]).is_integer() for k in ['Ny','Nz','Nt']]):
+                print('Skipping Mann '+str(Grid)+': the grid sizes must be powers of 2')
+                continue
+            Stages = None
+            for r in range(Repeat):
+                # the fastest run of each stage is kept
+                Result = BenchmarkCase(TurbModel,Grid,BenchDir,BaseConfig)
+                Stages = Result if Stages is None else \
+                         {k: min(Stages[k],v,key=lambda s: s['Wall']) for k,v in Result.items() if k in Stages}
+            Run['Cases'].append(dict(TurbModel=TurbModel,Stages=Stages,**Grid))
+            print(TurbModel+' '+' '.join([k+'='+str(v) for k,v in Grid.items()])+': '+\
+                  ', '.join(['{0} {1:.3g} s'.format(k,v['Wall']) for k,v in Stages.items() if '/' not in k]))
+
+    ResultFile = os.path.join(BenchDir,'Benchmark4DTurb.jsonl')
+    with open(ResultFile,'a') as f2write:
+        f2write.write(json.dumps(Run,default=str)+'\n')
+    print('Benchmark results appended to '+ResultFile)
+
+    return Run
+
+
+def BenchmarkCase(TurbModel,Grid,BenchDir,BaseConfig=None):
+
+    UserConfig = dict(BaseConfig or {})
+    UserConfig.update({'TurbModel': TurbModel,
+                       'SimInitialInputDir': BenchmarkInput(TurbModel,Grid,BenchDir),
+                       'exeDir': 'Synthetic3DTurb',
+                       'Xpos': [20*i for i in range(Grid['Nplanes'])],
+                       'Seeds': list(range(1,Grid['Nplanes']+1)),
+                       'saveDir': os.path.join(BenchDir,'Data'),
+                       'CohxCache': False,
+                       'Timing': True})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        ConfigParameters = TurbConfig(UserConfig)
+
+        # write the missing 3D wind fields with the stand-in generator, not timed
+        ConfigParameters,SimJobs = PlanSimJobs(ConfigParameters)
+        for SimJob in SimJobs:
+            Synthetic3DTurb(ConfigParameters,SimJob)
+
+        StartTiming(ConfigParameters)
+        if TurbModel == 'Kaimal':
+            with Stage('readBLgrid'):
+                readBLgrid(PlanePath(ConfigParameters,0)+'.wnd')
+        with Stage('CalcCohx'):
+            CalcCohx(ConfigParameters)
+        with Stage('Import3DTurb'):
+            TurbData3D, ConfigParameters = Import3DTurb(ConfigParameters)
+        with Stage('Generate4DTurb'):
+            TurbData4D, ConfigParameters = Generate4DTurb(ConfigParameters,TurbData3D)
+        del TurbData3D
+        with Stage('Export4DTurb'):
+            Export4DTurb(ConfigParameters,TurbData4D)
+        del TurbData4D
+        Report = StopTiming(ConfigParameters)
+
+    return {s['Name']: {'Wall': s['Wall'],'CPU': s['CPU'],'PeakRSS': s['PeakRSS']} for s in Report['Stages']}
+
+
+def BenchmarkInput(TurbModel,Grid,BenchDir):
+
+    # input file of TurbSim or MTG with the grid of the case
+    InputDir = os.path.join(BenchDir,'Inputs')
+    os.makedirs(InputDir,exist_ok=True)
+    Name = os.path.join(InputDir,TurbModel+'_Ny'+str(Grid['Ny'])+'_Nz'+str(Grid['Nz'])+'_Nt'+str(Grid['Nt']))
+
+    if TurbModel == 'Kaimal':
+        with open(TurbSimTemplate) as f2read:
+            TurbSimInput = f2read.readlines()
+        dt = float(TurbSimInput[20].split()[0])
+        # NumGrid_Z, NumGrid_Y, AnalysisTime
+        for line,value in [(18,Grid['Nz']),(19,Grid['Ny']),(21,'{0:g}'.format(Grid['Nt']*dt))]:
+            old_value = TurbSimInput[line].split()[0]
+            TurbSimInput[line] = TurbSimInput[line].replace(old_value,str(value),1)
+        with open(Name+'.inp','w') as f2write:
+            f2write.writelines(TurbSimInput)
+        return Name+'.inp'
+
+    # exe, output, alphaEps, length scale, gamma, seed, Nx, Ny, Nz, dx, dy, dz, high frequency compensation
+    MTGInput = ['mann_turb_x64.exe','Mann','0.11','61','3.2','1',str(Grid['Nt']),str(Grid['Ny']),str(Grid['Nz']),'4.0','4','4','false']
+    with open(Name+'.bat','w') as f2write:
+        f2write.write(' '.join(MTGInput))
+    return Name+'.bat'
+
+
+def Synthetic3DTurb(ConfigParameters,SimJob):
+
+    # stand-in for TurbSim and MTG: white noise with the standard deviations of the
+    # Kaimal model (IEC class A) or of ConfigParameters, written to the final outputs of SimJob
+    Nt   = int(ConfigParameters['Nt'])
+    Ny   = ConfigParameters['Ny']
+    Nz   = ConfigParameters['Nz']
+    seed = ConfigParameters['Seeds'][ConfigParameters['SimulationName3D'].index(SimJob['Name'])]
+    rng  = np.random.default_rng(int(seed))
+    Prefix = SimJob['Outputs'][0][1][:-len('.sum' if ConfigParameters['TurbModel'] == 'Kaimal' else '_u.bin')]
+
+    if ConfigParameters['TurbModel'] == 'Kaimal':
+        sigma_u  = 0.16*(0.75*ConfigParameters['Uref']+5.6)
+        velocity = rng.standard_normal((Nt,3,Ny,Nz))*np.reshape([sigma_u,0.8*sigma_u,0.5*sigma_u],(1,3,1,1))
+        velocity[:,0] += ConfigParameters['Uref']
+        writeBLgrid(Prefix,velocity,ConfigParameters['Lz']/(Nz-1),ConfigParameters['Ly']/(Ny-1),
+                    ConfigParameters['dt'],ConfigParameters['Href'])
+    else:
+        for comp in ['u','v','w']:
+            sigma = ConfigParameters.get('sigma_'+comp,1)
+            (sigma*rng.standard_normal(Nt*Ny*Nz)).astype(np.float32).tofile(Prefix+'_'+comp+'.bin')
+
+
+def GitCommit():
+
+    # commit of the code, None if it is not a git repository
+    try:
+        return subprocess.run(['git','rev-parse','--short','HEAD'],cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True,text=True,timeout=10).stdout.strip() or None
+    except (OSError,subprocess.SubprocessError):
+        return None
+
+
+def CompareBenchmark(ResultFile,Tolerance=0.25,MinTime=0.01):
+
+    with open(ResultFile) as f2read:
+        Runs = [json.loads(line) for line in f2read if line.strip()]
+
+    # the last run is compared with the previous run on the same host
+    New = Runs[-1]
+    Old = [Run for Run in Runs[:-1] if Run['Host'] == New['Host']]
+    if not Old:
+        print('No previous benchmark run on '+New['Host']+' to compare with.')
+        return []
+    Old = Old[-1]
+
+    def CaseName(Case):
+        return Case['TurbModel']+' Ny='+str(Case['Ny'])+' Nz='+str(Case['Nz'])+' Nt='+str(Case['Nt'])+' Nplanes='+str(Case['Nplanes'])
+
+    OldCases = {CaseName(Case): Case for Case in Old['Cases']}
+    Regressions = []
+    for Case in New['Cases']:
+        name = CaseName(Case)
+        if name not in OldCases:
+            continue
+        for stage,s in Case['Stages'].items():
+            s_old = OldCases[name]['Stages'].get(stage,None)
+            if s_old is None or max(s['Wall'],s_old['Wall']) < MinTime:
+                continue
+            if s['Wall'] > (1+Tolerance)*s_old['Wall']:
+                Regressions.append((name,stage,s_old['Wall'],s['Wall']))
+
+    print('Compared with the run of '+Old['Time']+' (commit '+str(Old['Commit'])+'): '+\
+          str(len(Regressions))+' regressions')
+    for name,stage,t_old,t_new in Regressions:
+        print('  {0}, {1}: {2:.3g} s -> {3:.3g} s'.format(name,stage,t_old,t_new))
+
+    return Regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark evoTurb with synthetic 3D wind fields.')
+    parser.add_argument('BenchDir',help='directory of the synthetic 3D wind fields and the results')
+    parser.add_argument('--TurbModel',nargs='+',default=['Kaimal','Mann'])
+    parser.add_argument('--Ny',nargs='+',type=int,default=[8,16])
+    parser.add_argument('--Nz',nargs='+',type=int,default=[8,16])
+    parser.add_argument('--Nt',nargs='+',type=int,default=[1024,4096])
+    parser.add_argument('--Nplanes',nargs='+',type=int,default=[3,5])
+    parser.add_argument('--Repeat',type=int,default=1)
+    parser.add_argument('--Precision',default='double')
+    parser.add_argument('--Tolerance',type=float,default=0.25,
+                        help='relative increase of the wall time reported as regression')
+    args = parser.parse_args(argv)
+
+    Matrix = {'Ny': args.Ny,'Nz': args.Nz,'Nt': args.Nt,'Nplanes': args.Nplanes}
+    Benchmark4DTurb(Matrix,args.BenchDir,args.TurbModel,args.Repeat,{'Precision': args.Precision})
+    Regressions = CompareBenchmark(os.path.join(args.BenchDir,'Benchmark4DTurb.jsonl'),args.Tolerance)
+
+    # a non-zero exit code marks regressions, e.g. in a CI job
+    return 1 if Regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
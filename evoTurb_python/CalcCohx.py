@@ -4,15 +4,22 @@ CalcCohx
 function: calculate the longitudinal coherence
 ------------------------------------------------------------------------------------
 Usage
-Cohx,ConfigParameters = CalcCohx(ConfigParameters)
+Cohx,ConfigParameters = CalcCohx(ConfigParameters,FirstRow)
 -----------------------------------------------------------------------------------
 Inputs
 ConfigParameters: -dict, configuration parameters 
+FirstRow: -bool, optional, only the coherence between the first plane and all planes is
+          returned, which defines the whole matrix of evenly spaced planes (see #CalcHx.py#),
+          default False
 ---------------------------------------------------------------------------------
 Outputs
 ConfigParameters: configuration parameters, -dict 
 Cohx: longitudinal coherence
        - 3D array, with size of (Nplanes,Nplanes,number of freq) 
+       - 2D array, with size of (Nplanes,number of freq) if FirstRow is True
+--------------------------------------------------------------------------------
+The coherence only depends on the separation of two planes, so the wind evolution model
+is only evaluated once per unique separation (Nplanes values for evenly spaced planes).
 --------------------------------------------------------------------------------
 References
 1.'Exp-UserDefined' uses the wind evolution model (Eq.4) and
@@ -39,6 +46,7 @@ References
    The GPR models are trained with measurement data from an onshore flat site.
    Due to the limitation of the training data, it is not recommended to 
    use the GPR models for the cases where the separations between the unfrozen planes exceed 109 m.
+   The GPR models of the matlab version are used, see #PredictExpGPR.py#.
 ----------------------------------------------------------------------------------------------------
 Created on 20.06.2021 
 Yiyin Chen    (c) University of Stuttgart 
@@ -49,17 +57,22 @@ Modified
 """
 
 # import libirary
-from scipy.spatial.distance import cdist
 import numpy as np
 import math
-# import scipy.io as sio
+import os
+
+# the GPR models of the model 'Exp-GPR' shipped with the matlab version
+DefaultGPRModel = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','evoTurb_matlab','GPR models','ExpGPR.mat')
 
-def CalcCohx(ConfigParameters):
+def CalcCohx(ConfigParameters,FirstRow=False):
 
     # spatial distance x
     X = np.reshape(ConfigParameters['Xpos'],(ConfigParameters['Nplanes'],1),order="F")
-    X = np.concatenate((X,0*X),axis=1)
-    r_x = np.reshape(cdist(X, X),(ConfigParameters['Nplanes']**2,1),order="F")   
+    r_x = np.reshape(np.abs(X-X.T),(ConfigParameters['Nplanes']**2,1),order="F")   
+    
+    # unique separations with size of (number of separations,1), and the separation of each pair of planes
+    r_x,Pairs = np.unique(np.ravel(r_x),return_inverse=True)
+    r_x = np.reshape(r_x,(-1,1))
     
     if ConfigParameters['EvoModel']!='Exp-UserDefined':
         
@@ -125,24 +138,20 @@ def CalcCohx(ConfigParameters):
             m = 2*(alpha<=1)+1*(alpha>1)
             Cohx_squared = np.exp(-2*alpha*G)*(1-np.exp(-1/(2*alpha**m*xi**2)))**2
             
-# =============================================================================
-#     elif ConfigParameters['EvoModel'] == 'Exp-GPR':
-#             GPRmdl = sio.loadmat('ExpGPR.mat') 
-#             predictor_a = struct2table(struct('V_long_mean',ConfigParameters.Uref,...
-#                 'V_vert_std',ConfigParameters.sigma_w,'DirError',0))
-#             predictor_b = struct2table(struct('V_long_mean',ConfigParameters.Uref*ones(size(r_x)),...
-#                 'V_long_TI_U',ConfigParameters.sigma_u/ConfigParameters.Uref*ones(size(r_x)),...
-#                 'V_long_skew',zeros(size(r_x)),'V_long_kurt',zeros(size(r_x)),...
-#                 'V_lat_skew',zeros(size(r_x)),'V_vert_skew',zeros(size(r_x)),...
-#                 'vlos_d',r_x))
-#             ConfigParameters.evo_a = predict(cgprMdl_a,predictor_a)
-#             ConfigParameters.evo_b = predict(cgprMdl_b,predictor_b)
-#             ConfigParameters.evo_b(predictor_b.vlos_d==0)=0 
-#             Cohx_squared = exp(-sqrt(ConfigParameters.evo_a.^2.*(ConfigParameters.f.*r_x./ConfigParameters.Uref).^2+...
-#                 ConfigParameters.evo_b.^2))
-# =============================================================================
+    elif ConfigParameters['EvoModel'] == 'Exp-GPR':
+            # the GPR models are read once and evo_b is predicted for all separations at once,
+            # scipy is only imported for this model
+            from PredictExpGPR import PredictExpGPR
+            ConfigParameters['evo_a'],evo_b = PredictExpGPR(ConfigParameters,r_x)
+            Cohx_squared = np.exp(-np.sqrt(ConfigParameters['evo_a']**2*(ConfigParameters['f']*r_x/ConfigParameters['Uref'])**2+\
+                evo_b**2))
+            ConfigParameters['evo_b'] = evo_b[Pairs]
          
     
-    Cohx = np.reshape(np.sqrt(Cohx_squared),(ConfigParameters['Nplanes'],ConfigParameters['Nplanes'],len(ConfigParameters['f'])),order="F")
+    Cohx = np.sqrt(Cohx_squared)
+    if FirstRow:
+        return Cohx[Pairs[:ConfigParameters['Nplanes']]],ConfigParameters
+    
+    Cohx = np.reshape(Cohx[Pairs],(ConfigParameters['Nplanes'],ConfigParameters['Nplanes'],len(ConfigParameters['f'])),order="F")
 
     return Cohx,ConfigParameters
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+CalcHx
+function: calculate the Cholesky factors of the longitudinal coherence
+          and cache them on the disk
+------------------------------------------------------------------------------------
+Usage
+Hx,ConfigParameters = CalcHx(ConfigParameters)
+WriteCohxCache(ConfigParameters,Hx)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters
+---------------------------------------------------------------------------------
+Outputs
+ConfigParameters: configuration parameters, -dict
+Hx: lower triangular Cholesky factors of the longitudinal coherence
+       - 3D array, with size of (number of freq,Nplanes,Nplanes)
+---------------------------------------------------------------------------------
+The factors only depend on Xpos, the frequency vector, Uref, and the parameters
+of the wind evolution model. If ConfigParameters['CohxCache'] is True, they are
+saved in ConfigParameters['saveDir_Cache'] with a hash of these inputs as file name.
+Later runs with the same inputs read the factors memory-mapped from the cache
+instead of calling #CalcCohx.py# again. The least recently used factors are deleted
+if the cache exceeds ConfigParameters['CohxCacheSize'] bytes.
+If the planes are evenly spaced, the coherence matrix is a symmetric Toeplitz matrix at
+each frequency. Then only its first row is calculated and factorized by the Schur
+algorithm in O(Nplanes^2) per frequency, instead of the full matrix and the dense Cholesky
+decomposition in O(Nplanes^3) (ConfigParameters['ToeplitzCohx'], default True). The
+factors equal those of the dense decomposition up to rounding errors.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+import hashlib
+import json
+import os
+from CalcCohx import CalcCohx, DefaultGPRModel
+from StageTimer import Stage
+
+# wind statistics derived in #CalcCohx.py#, restored on cache hits
+DerivedParameters = ['evo_a','evo_b','sigma_u','sigma_v','sigma_w','L_u']
+
+
+def CalcHx(ConfigParameters):
+
+    if not ConfigParameters.get('CohxCache',False):
+        return FactorizeCohx(ConfigParameters)
+
+    CacheDir = ConfigParameters['saveDir_Cache']
+    key      = CohxCacheKey(ConfigParameters)
+    HxFile   = os.path.join(CacheDir,key+'.npy')
+    ParFile  = os.path.join(CacheDir,key+'.json')
+
+    # read the factors from the cache
+    if os.path.isfile(HxFile) and os.path.isfile(ParFile):
+        try:
+            with Stage('CacheRead'):
+                Hx = np.load(HxFile,mmap_mode='r')
+                with open(ParFile) as f2read:
+                    Parameters = json.load(f2read)
+        except (OSError,ValueError):
+            print('Corrupted coherence cache entry '+key+', recalculating...')
+        else:
+            ConfigParameters.update(Parameters)
+            # mark the entry as recently used
+            os.utime(HxFile)
+            print('Longitudinal coherence factors read from the cache.')
+            return Hx,ConfigParameters
+
+    Hx,ConfigParameters = FactorizeCohx(ConfigParameters)
+    WriteCohxCache(ConfigParameters,Hx)
+
+    return Hx,ConfigParameters
+
+
+def WriteCohxCache(ConfigParameters,Hx):
+
+    CacheDir = ConfigParameters['saveDir_Cache']
+    key      = CohxCacheKey(ConfigParameters)
+    HxFile   = os.path.join(CacheDir,key+'.npy')
+    ParFile  = os.path.join(CacheDir,key+'.json')
+
+    # write the cache entry, the .npy file is written last because the entry is
+    # only valid if both files exist
+    Parameters = {k: np.asarray(ConfigParameters[k]).tolist() for k in DerivedParameters if k in ConfigParameters}
+    tmpName    = '.'+str(os.getpid())+'.tmp'
+    with open(ParFile+tmpName,'w') as f2write:
+        json.dump(Parameters,f2write)
+    os.replace(ParFile+tmpName,ParFile)
+    with open(HxFile+tmpName,'wb') as f2write:
+        np.save(f2write,Hx)
+    os.replace(HxFile+tmpName,HxFile)
+
+    EvictCohxCache(CacheDir,ConfigParameters.get('CohxCacheSize',2e9),key)
+
+
+def FactorizeCohx(ConfigParameters):
+
+    # evenly spaced planes: Toeplitz matrix defined by the coherence to the first plane
+    dx = np.diff(np.asarray(ConfigParameters['Xpos'],dtype=float))
+    if ConfigParameters.get('ToeplitzCohx',True) and len(dx) > 0 and dx[0] != 0 and np.allclose(dx,dx[0],rtol=1e-9,atol=0):
+        with Stage('CalcCohx'):
+            Row,ConfigParameters = CalcCohx(ConfigParameters,FirstRow=True)
+        with Stage('Cholesky'):
+            Hx = ToeplitzCholesky(np.transpose(Row))
+        return Hx,ConfigParameters
+
+    # calculate longitudinal coherence for the u component
+    with Stage('CalcCohx'):
+        Cohx,ConfigParameters = CalcCohx(ConfigParameters)
+
+    # Cholesky decomposition for all frequencies at once, size: (nf,Nplanes,Nplanes)
+    with Stage('Cholesky'):
+        Hx = np.linalg.cholesky(np.moveaxis(Cohx,2,0))
+
+    return Hx,ConfigParameters
+
+
+def ToeplitzCholesky(Row):
+
+    # Row: first rows of the symmetric positive definite Toeplitz matrices with size of (nf,n)
+    # Schur algorithm: the rows of the upper factor are the first generator, which is shifted
+    # by one and rotated against the second generator in each step. The frequencies are
+    # processed in blocks of about 4 MB of factors.
+    nf,n = np.shape(Row)
+    Upper = np.empty((nf,n,n))
+    Block = max(1,2**19//n**2)
+    for i0 in range(0,nf,Block):
+        U = Upper[i0:i0+Block]
+        U[:] = 0
+        U[:,0] = Row[i0:i0+Block]/np.sqrt(Row[i0:i0+Block,:1])
+        b = U[:,0].copy()
+        b[:,0] = 0
+        for k in range(1,n):
+            a   = U[:,k-1,k-1:n-1]
+            bk  = b[:,k:]
+            rho = bk[:,:1]/a[:,:1]
+            if not np.all(np.abs(rho) < 1):
+                raise np.linalg.LinAlgError('Matrix is not positive definite')
+            s = 1/np.sqrt((1-rho)*(1+rho))
+            np.multiply(s,a-rho*bk,out=U[:,k,k:])
+            bk -= rho*a
+            bk *= s
+
+    # lower factors as a view of the upper ones, size: (nf,n,n)
+    return np.transpose(Upper,(0,2,1))
+
+
+def CohxCacheKey(ConfigParameters):
+
+    # only the inputs of the selected wind evolution model enter the key
+    Inputs = {'EvoModel': ConfigParameters['EvoModel'],
+              'Xpos': np.asarray(ConfigParameters['Xpos'],dtype=float).tolist(),
+              'Uref': float(ConfigParameters['Uref'])}
+    if ConfigParameters['EvoModel'] == 'Exp-UserDefined':
+        Names = ['evo_a','evo_b']
+    elif ConfigParameters['TurbModel'] == 'Kaimal':
+        Names = ['TurbModel','TurbClass','Href']
+    else:
+        Names = ['TurbModel','sigma_u','sigma_v','sigma_w','L_u']
+    for k in Names:
+        Inputs[k] = np.asarray(ConfigParameters[k]).tolist()
+    if ConfigParameters['EvoModel'] == 'Exp-GPR':
+        Inputs['GPRModel'] = os.path.abspath(ConfigParameters.get('GPRModel',None) or DefaultGPRModel)
+
+    key = hashlib.sha256(json.dumps(Inputs,sort_keys=True).encode())
+    key.update(np.ascontiguousarray(ConfigParameters['f'],dtype=np.float64).tobytes())
+
+    return key.hexdigest()
+
+
+def EvictCohxCache(CacheDir,CacheSize,keep):
+
+    # cache entries sorted by the last use, oldest first
+    entries = []
+    for name in os.listdir(CacheDir):
+        if name.endswith('.npy'):
+            key   = name[:-4]
+            files = [os.path.join(CacheDir,key+ext) for ext in ['.npy','.json']]
+            try:
+                entries.append((os.path.getmtime(files[0]),sum([os.path.getsize(f) for f in files if os.path.isfile(f)]),key,files))
+            except OSError:
+                pass   # removed by another process
+    entries.sort()
+
+    TotalSize = sum([entry[1] for entry in entries])
+    for _,size,key,files in entries:
+        if TotalSize <= CacheSize:
+            break
+        if key == keep:
+            continue
+        for f in files:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+        TotalSize -= size
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+EstimateCohx
+function: estimate the longitudinal coherence of a generated 4D wind field and compare
+          it with the coherence of the wind evolution model
+------------------------------------------------------------------------------------
+Usage
+Coh = EstimateCohx(ConfigParameters,Data,Comp,NperSeg,Overlap,Window)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters of the 4D wind field, output of the
+                  function #Generate4DTurb.py# or #Export4DTurb.py#
+Data: -dict, 4D wind field with the fields 'U', 'V', and 'W' with size of (Nz,Ny,Nt,Nplanes)
+      (output of #Generate4DTurb.py#) or an EvoReader of a .evo file (see #EvoFile.py#),
+      the .evo file does not contain the turbine plane
+Comp: -string, optional, the wind component 'U' (default), 'V', or 'W'
+NperSeg: -int, optional, number of time steps of a Welch segment, default min(1024,Nt)
+Overlap: -float, optional, overlap of the segments, default 0.5
+Window: -string, optional, window of the segments (see scipy.signal.get_window), default 'hann'
+---------------------------------------------------------------------------------
+Outputs
+Coh: -dict
+     __['f']: frequencies of the estimate without 0 Hz [Hz]
+     __['Cohx']: estimated magnitude coherence between the planes, with size of
+                 (Nplanes,Nplanes,number of freq) as #CalcCohx.py#
+     __['Target']: the coherence of the wind evolution model at the frequencies f
+     __['Error']: root mean square of Cohx-Target over all pairs of planes, per frequency
+     __['Spectra']: auto-spectra of the planes averaged over the grid points with size of
+                    (Nplanes,number of freq) [(m/s)^2/Hz]
+---------------------------------------------------------------------------------
+The auto- and cross-spectra of all planes are estimated with the method of Welch at all
+grid points at once: the time series without the mean value are split into overlapping 
+windowed segments, transformed by one batched FFT in single precision (the statistical
+error of the estimate is much larger), and the cross-spectral matrix of the planes is 
+accumulated by one matrix product per frequency over all segments and grid points. The coherence is estimated from the spectra averaged over all grid points
+as in evoTurb_matlab/example/TestCoherence.m. The grid points are processed in blocks
+of rows of about 64 MB.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+from scipy.signal import get_window
+from CalcCohx import CalcCohx
+from EvoFile import EvoReader
+from Generate4DTurb import FFTModule
+
+
+def EstimateCohx(ConfigParameters,Data,Comp='U',NperSeg=None,Overlap=0.5,Window='hann'):
+
+    if isinstance(Data,EvoReader):
+        # the planes of the .evo file, read in blocks of rows, size: (Nplanes,Nt,Ny,Nz)
+        Nplanes,Nt,Ny,Nz = Data.Nplanes,Data.Nt,Data.Ny,Data.Nz
+        Xpos = list(Data.Xpos)
+        k = ['U','V','W'].index(Comp)
+        ReadRows = lambda iz: np.transpose(Data[:,k,:,:,iz],(3,2,1,0))
+    else:
+        Nz,Ny,Nt,Nplanes = np.shape(Data[Comp])
+        Xpos = list(ConfigParameters['Xpos'])
+        ReadRows = lambda iz: Data[Comp][iz]
+    if Nplanes != len(Xpos):
+        raise ValueError('The number of planes of the 4D wind field does not match Xpos.')
+
+    NperSeg = int(NperSeg or min(1024,Nt))
+    Hop     = max(1,int(NperSeg*(1-Overlap)))
+    nSeg    = (Nt-NperSeg)//Hop+1
+    win     = get_window(Window,NperSeg).astype(np.float32)
+    fft     = FFTModule(np.float32)
+    f       = np.fft.rfftfreq(NperSeg,ConfigParameters['dt'])[1:]
+    nf      = len(f)
+
+    print('Estimating the longitudinal coherence of '+str(Nplanes)+' planes with '+\
+          str(nSeg)+' segments at '+str(Ny*Nz)+' grid points...')
+
+    # cross-spectral matrix of the planes summed over all segments and grid points
+    S = np.zeros((nf,Nplanes,Nplanes),dtype=np.complex128)
+    NzBlock = int(max(1,(64*2**20)//(8*Ny*nSeg*NperSeg*Nplanes)))
+    for iz in range(0,Nz,NzBlock):
+
+        # time series without the mean value, size: (nz,Ny,Nplanes,Nt)
+        rows = np.moveaxis(np.asarray(ReadRows(slice(iz,iz+NzBlock)),dtype=np.float32),3,2).copy()
+        rows -= np.mean(rows,axis=3,keepdims=True)
+        # windowed segments of all grid points of the block, size: (nz,Ny,Nplanes,nSeg,NperSeg)
+        seg  = np.lib.stride_tricks.sliding_window_view(rows,NperSeg,axis=3)[:,:,:,::Hop][:,:,:,:nSeg]
+        X    = fft.rfft(seg*win,axis=4)[...,1:]
+        del rows,seg
+
+        # size: (nf,number of segments and grid points,Nplanes)
+        X = np.reshape(np.moveaxis(X,(4,2),(0,-1)),(nf,-1,Nplanes))
+        S += np.matmul(np.conj(np.transpose(X,(0,2,1))),X)
+        del X
+
+    # one-sided spectral density averaged over the segments and grid points
+    S *= 2/(ConfigParameters['Fs']*np.sum(np.float64(win)**2)*nSeg*Ny*Nz)
+    if NperSeg % 2 == 0:
+        S[-1] /= 2
+    Spectra = np.real(np.diagonal(S,axis1=1,axis2=2))
+    Cohx = np.abs(S)/np.sqrt(Spectra[:,:,np.newaxis]*Spectra[:,np.newaxis,:])
+    Cohx = np.transpose(Cohx,(1,2,0))
+
+    # coherence of the wind evolution model at the frequencies of the estimate
+    Target,_ = CalcCohx(dict(ConfigParameters,Xpos=Xpos,Nplanes=Nplanes,f=f))
+
+    # error over all pairs of different planes
+    pairs = np.triu_indices(Nplanes,1)
+    Error = np.sqrt(np.mean((Cohx[pairs]-Target[pairs])**2,axis=0)) if Nplanes > 1 else np.zeros(nf)
+
+    print('Longitudinal coherence estimated, RMS error: '+'{0:.3f}'.format(np.sqrt(np.mean(Error**2))))
+
+    return {'f': f,'Cohx': Cohx,'Target': Target,'Error': Error,'Spectra': np.transpose(Spectra)}
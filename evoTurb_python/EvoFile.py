@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+EvoFile
+function: write 4D wind fields into the binary file (.evo) plane by plane or in time chunks,
+          and read parts of them without loading the whole file
+--------------------------------------------------------------------------
+Usage
+with EvoWriter(FileName,Xpos,Ny,Nz,Nt,Scale,Offset) as Writer:
+    Writer.WritePlane(i,U,V,W)
+    Writer.WriteTimeChunk(it,U,V,W)
+    Writer.CopyPlanes(i,fid,DataOffset,n)
+with EvoReader(FileName,Ny,Nz,Scale,Offset) as Reader:
+    u = Reader[i,0,it:it+nt,:,:]
+Reader = OpenEvo(ConfigParameters)
+---------------------------------------------------------------------------
+Inputs
+FileName: -string, the name of the .evo file
+Xpos: -list, x positions of the unfrozen planes in the file (without the turbine plane)
+Ny, Nz, Nt: -int, number of grid points along y and z, and number of time steps
+Scale, Offset: -array, binary scale and offset of the u, v, and w component
+WritePlane: U, V, W are 3D arrays with size of (Nz,Ny,Nt) of the i-th plane in the file
+WriteTimeChunk: U, V, W are 4D arrays with size of (Nz,Ny,nt,number of planes in the file)
+                of the time steps it...it+nt-1
+CopyPlanes: copies n planes of another .evo file, opened as fid with the data starting at 
+            the byte DataOffset, to the planes i...i+n-1 of the file without any change
+EvoReader: Scale, Offset are optional, without them the int16 values are returned, 
+           dtype is the type of the scaled values (default float64)
+ConfigParameters: -dict, configuration parameters, output of the function #Export4DTurb.py#
+----------------------------------------------------------------------------
+Outputs
+a binary file of 4D wind fields (.evo)
+  int16 header: number of unfrozen planes, x positions of the unfrozen planes
+  int16 data: dimension 1 = time, 2 = u,v,w, 3 = Ny, 4 = Nz, 5 = unfrozen planes
+              (the first dimension changes fastest)
+Reader: the .evo file as an array with size of (Nplanes,3,Nt,Ny,Nz), indexed by
+        (plane, component, time, y, z) with integers or slices. The file is memory-mapped
+        when it is opened, only the header is read. Indexing reads only the indexed 
+        values and applies the binary scale and offset to them. 
+        Reader.Xpos, Reader.Nplanes, Reader.Nt, Reader.Ny, Reader.Nz describe the file, 
+        Nt follows from the file size.
+OpenEvo opens the *_upstream.evo file of a 4D wind field with the grid and the binary 
+scale and offset in ConfigParameters.
+-----------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+-------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+import os
+from StageTimer import Stage
+
+
+class EvoWriter:
+
+    def __init__(self,FileName,Xpos,Ny,Nz,Nt,Scale,Offset):
+
+        self.FileName = FileName
+        self.Nplanes  = len(Xpos)
+        self.Ny       = int(Ny)
+        self.Nz       = int(Nz)
+        self.Nt       = int(Nt)
+        self.Scale    = Scale
+        self.Offset   = Offset
+        self.Body     = None
+
+        self.fid = open(FileName,'wb')
+        # write the head line with the number of unfrozen planes
+        # write the x positions of unfrozen planes
+        array2write = np.append(self.Nplanes, Xpos)
+        np.array(np.int16(array2write)).tofile(self.fid)
+        self.DataOffset = self.fid.tell()
+
+        # the size of one plane in the file: Nz x Ny x 3 x Nt
+        self.PlaneSize = self.Nz*self.Ny*3*self.Nt
+        self.fid.truncate(self.DataOffset+2*self.PlaneSize*self.Nplanes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def Quantize(self,U,V,W):
+
+        # apply binary scale and offset, the components are stacked along the
+        # axis after Ny, in the file the time changes fastest
+        data = np.empty(np.shape(U)[0:2]+(3,)+np.shape(U)[2:],dtype=np.int16)
+        data[:,:,0] = np.int16((np.asarray(U)-self.Offset[0])/self.Scale[0])
+        data[:,:,1] = np.int16((np.asarray(V)-self.Offset[1])/self.Scale[1])
+        data[:,:,2] = np.int16((np.asarray(W)-self.Offset[2])/self.Scale[2])
+        return data
+
+    def WritePlane(self,i,U,V,W):
+
+        # one plane is stored contiguously as (Nz,Ny,3,Nt)
+        with Stage('Quantize'):
+            data = self.Quantize(U,V,W)
+        with Stage('Write'):
+            self.fid.seek(self.DataOffset+2*self.PlaneSize*i)
+            data.tofile(self.fid)
+
+    def WriteTimeChunk(self,it,U,V,W):
+
+        # a time chunk is scattered over the file, write it through a memory map
+        if self.Body is None:
+            self.fid.flush()
+            self.Body = np.memmap(self.FileName,dtype=np.int16,mode='r+',offset=self.DataOffset,
+                                  shape=(self.Nplanes,self.Nz,self.Ny,3,self.Nt))
+        with Stage('Quantize'):
+            data = self.Quantize(U,V,W)   # (Nz,Ny,3,nt,Nplanes)
+        with Stage('Write'):
+            self.Body[:,:,:,:,it:it+np.shape(U)[2]] = np.moveaxis(data,4,0)
+
+    def CopyPlanes(self,i,fid,DataOffset,n):
+
+        fid.seek(DataOffset)
+        self.fid.seek(self.DataOffset+2*self.PlaneSize*i)
+        nbytes = 2*self.PlaneSize*n
+        while nbytes > 0:
+            block = fid.read(min(nbytes,1 << 24))
+            if not block:
+                raise ValueError('Unexpected end of file in '+fid.name+'.')
+            self.fid.write(block)
+            nbytes -= len(block)
+
+    def close(self):
+
+        if self.Body is not None:
+            self.Body.flush()
+            self.Body = None
+        self.fid.close()
+
+
+class EvoReader:
+
+    def __init__(self,FileName,Ny,Nz,Scale=None,Offset=None,dtype=np.float64):
+
+        self.FileName = FileName
+        self.Ny       = int(Ny)
+        self.Nz       = int(Nz)
+        self.dtype    = dtype
+
+        # header: number of unfrozen planes and their x positions
+        with open(FileName,'rb') as fid:
+            self.Nplanes = int(np.fromfile(fid,dtype=np.int16,count=1)[0])
+            self.Xpos    = np.fromfile(fid,dtype=np.int16,count=self.Nplanes)
+            FileSize     = os.fstat(fid.fileno()).st_size
+        self.DataOffset = 2*(1+self.Nplanes)
+
+        # the number of time steps follows from the size of the file
+        nValues = (FileSize-self.DataOffset)//2
+        if len(self.Xpos) != self.Nplanes or self.Nplanes < 1 or (FileSize-self.DataOffset) % 2 or \
+           nValues % (self.Nplanes*self.Nz*self.Ny*3):
+            raise ValueError('The file '+FileName+' does not match a 4D wind field with Ny = '+\
+                             str(self.Ny)+' and Nz = '+str(self.Nz)+'.')
+        self.Nt = nValues//(self.Nplanes*self.Nz*self.Ny*3)
+
+        # the planes are stored as (Nz,Ny,3,Nt)
+        self.Body = np.memmap(FileName,dtype=np.int16,mode='r',offset=self.DataOffset,
+                              shape=(self.Nplanes,self.Nz,self.Ny,3,self.Nt))
+        self.shape = (self.Nplanes,3,self.Nt,self.Ny,self.Nz)
+
+        self.Scale  = None if Scale is None else np.reshape(np.asarray(Scale,dtype=np.float64),(3,))
+        self.Offset = np.zeros(3) if Offset is None else np.reshape(np.asarray(Offset,dtype=np.float64),(3,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __getitem__(self,key):
+
+        key = key if isinstance(key,tuple) else (key,)
+        if len(key) > 5:
+            raise IndexError('The 4D wind field is indexed by (plane, component, time, y, z).')
+        key = key+(slice(None),)*(5-len(key))
+
+        # integers are replaced by slices, their axes are removed at the end
+        squeeze = tuple([axis for axis,k in enumerate(key) if isinstance(k,(int,np.integer))])
+        key = tuple([slice(k,k+1 if k != -1 else None) if axis in squeeze else k for axis,k in enumerate(key)])
+
+        # only the indexed values are read from the file, in the order of the file
+        # with the time changing fastest, size: (planes,z,y,components,time)
+        raw = np.array(self.Body[key[0],key[4],key[3],key[1],key[2]])
+        if self.Scale is None:
+            data = raw
+        else:
+            data = raw*np.reshape(self.Scale[key[1]],(1,1,1,-1,1)).astype(self.dtype)+\
+                   np.reshape(self.Offset[key[1]],(1,1,1,-1,1)).astype(self.dtype)
+        return np.squeeze(np.transpose(data,(0,3,4,2,1)),axis=squeeze)
+
+    def close(self):
+
+        # the memory map is closed when the arrays returned by indexing are released
+        self.Body = None
+
+
+def OpenEvo(ConfigParameters,dtype=np.float64):
+
+    FileName = os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName4D']+'_upstream.evo')
+    return EvoReader(FileName,ConfigParameters['Ny'],ConfigParameters['Nz'],\
+                     ConfigParameters['binary_Scale'],ConfigParameters['binary_Offset'],dtype)
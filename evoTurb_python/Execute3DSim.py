@@ -5,6 +5,7 @@ function: Run 3D simulations by calling Mann Turbulence Generator or Turbsim
 -------------------------------------------------------------------------------------------
 Usage
 ConfigParameters =  Execute3DSim(ConfigParameters)
+ConfigParameters,SimJobs = PlanSimJobs(ConfigParameters)
 -------------------------------------------------------------------------------------------
 Inputs
 ConfigParameters: -dict, configuration parameters, output of the function #TurbConfig.py#
@@ -12,6 +13,23 @@ ConfigParameters: -dict, configuration parameters, output of the function #TurbC
 Outputs
 ConfigParameters: -dict, configuration parameters 
 3D wind fields saved in ConfigParameters['saveDir_3D']
+log files of TurbSim or MTG saved in ConfigParameters['saveDir_SimInputFiles']
+---------------------------------------------------------------------------------------------
+The 3D simulations of the different seeds are run in parallel with
+ConfigParameters['NumWorkers3D'] workers. Each run is limited to ConfigParameters['SimTimeout'] 
+seconds and repeated up to ConfigParameters['SimRetries'] times if it fails. Each run is started
+in its own process group, so a run that exceeds the time limit is killed with all its child
+processes (e.g. MTG started by the batch file) before it is repeated. The outputs are 
+written to ConfigParameters['saveDir_SimInputFiles'] first and only moved to 
+ConfigParameters['saveDir_3D'] if the run is complete.
+If ConfigParameters['Store3D'] is set, the 3D wind fields are saved in this content-addressed
+store instead of ConfigParameters['saveDir_3D'] and reused by all projects with the same 
+generator input, .exe file and seed (see #Store3DTurb.py#). The paths of the 3D wind fields 
+are saved in ConfigParameters['Path3D'].
+PlanSimJobs only names the 3D wind fields and writes the input files of the missing ones,
+the returned SimJobs can be run with RunSimJobs or RunSimJob (see #Sweep.py#).
+If ConfigParameters['Backend3D'] is 'native', TurbSim or MTG is not run and the 3D wind fields 
+are simulated in memory with #Simulate3DTurb.py# (see #Run3DTurb.py#), only the names are set here.
 ---------------------------------------------------------------------------------------------
 Created on 19.11.2020 
 Feng Guo      (c) Flensburg University of Applied Sciences
@@ -23,13 +41,43 @@ Modified
 
 # import libirary
 import os
+import signal
 import subprocess
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Store3DTurb import Store3DKey, LookupStore3D, WriteManifest, EvictStore3D
+from StageTimer import Stage
 
 
 def Execute3DSim(ConfigParameters):
+    
+    # name the 3D wind fields and prepare the input files of the missing ones
+    ConfigParameters,SimJobs = PlanSimJobs(ConfigParameters)
+    
+    # run the 3D simulations in parallel, they are independent of each other
+    RunSimJobs(ConfigParameters,SimJobs)
+    
+    # keep the store within its quota, the entries of this run are not deleted
+    # (the native backend has no store keys)
+    if ConfigParameters.get('Store3D',None):
+        EvictStore3D(ConfigParameters['Store3D'],ConfigParameters.get('Store3DSize',50e9),\
+                     {key for key in ConfigParameters['StoreKeys3D'] if key})
+      
+    return ConfigParameters      
+
+
+def PlanSimJobs(ConfigParameters):
 
     SimulationNames3D               = list(range(ConfigParameters['Nplanes']))
+    SimJobs                         = []
+    # paths of the 3D wind fields without the file name ending
+    Path3D                          = [None]*ConfigParameters['Nplanes']
+    # content-addressed store of the 3D wind fields, see #Store3DTurb.py#
+    Store                           = ConfigParameters.get('Store3D',None)
+    StoreKeys                       = [None]*ConfigParameters['Nplanes']
+    # the native generator simulates the 3D wind fields in memory, see #Simulate3DTurb.py#
+    Native                          = ConfigParameters.get('Backend3D','exe') == 'native'
     
     if ConfigParameters['TurbModel'] == 'Kaimal': 
     
@@ -49,63 +97,93 @@ def Execute3DSim(ConfigParameters):
                                     '_dt'+'{0:g}'.format(ConfigParameters['dt']).replace('.','d')+\
                                     '_Seed'+'{0:g}'.format(ConfigParameters['Seeds'][i])
             
-            # check if 3D wind field exists
-            if not os.path.isfile(os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'.wnd')):
+            if Native:
+                continue
+            
+            with open(ConfigParameters['SimInitialInputDir']) as f2read:
+                TurbSimInput = f2read.readlines()                
+            
+            # modify the random seed in the input file of TurbSim 
+            line_text = TurbSimInput[4]
+            old_seed = line_text.split()[0]
+            TurbSimInput[4] = line_text.replace(old_seed,str(ConfigParameters['Seeds'][i]))
+            del line_text,old_seed                                    
+            
+            # write the reference wind speed, the IEC turbulence class and wind type,
+            # they may differ from the input file in a parameter sweep (see #TurbConfig.py#)
+            line_text = TurbSimInput[39]
+            old_value = line_text.split()[0]
+            if float(old_value) != ConfigParameters['Uref']:
+                TurbSimInput[39] = line_text.replace(old_value,'{0:g}'.format(ConfigParameters['Uref']),1)
+            for line,key in [(33,'TurbClass'),(34,'WindType')]:
+                line_text = TurbSimInput[line]
+                old_value = line_text.split()[0]
+                if old_value[1:-1] != ConfigParameters[key]:
+                    TurbSimInput[line] = line_text.replace(old_value,'"'+ConfigParameters[key]+'"',1)
+            del line_text,old_value
+            
+            # Check and set the flag of ScaleIEC as 0 because the scaling will
+            # distort the complex Fourier coefficients 
+            line_text = TurbSimInput[15]
+            flag = line_text.split()[0]
+            if flag != '0':
+                TurbSimInput[15] = line_text.replace(flag,'0')
+                print('ScaleIEC is set 0, otherwise it causes errors in the 4D wind field generation.')
+            del line_text,flag
               
-                with open(ConfigParameters['SimInitialInputDir']) as f2read:
-                    TurbSimInput = f2read.readlines()                
-                
-                # modify the random seed in the input file of TurbSim 
-                line_text = TurbSimInput[4]
-                old_seed = line_text.split()[0]
-                TurbSimInput[4] = line_text.replace(old_seed,str(ConfigParameters['Seeds'][i]))
-                del line_text,old_seed                                    
-                
-                # Check and set the flag of ScaleIEC as 0 because the scaling will
-                # distort the complex Fourier coefficients 
-                line_text = TurbSimInput[15]
-                flag = line_text.split()[0]
-                if flag != '0':
-                    TurbSimInput[15] = line_text.replace(flag,'0')
-                    print('ScaleIEC is set 0, otherwise it causes errors in the 4D wind field generation.')
-                del line_text,flag
-                  
-                # Check and set the flag of the vertical mean flow (uptilt) angle 
-                # and the Horizontal mean flow (skew) angle as 0
-                # because the current evoTurb does not support it      
-                line_text = TurbSimInput[26]
-                flag = line_text.split()[0]
-                if flag != '0':
-                    TurbSimInput[26] = line_text.replace(flag,'0')
-                    print('VFlowAng is set 0, otherwise it will cause errors in the 4D wind field generation.')
-                del line_text,flag
-                
-                line_text = TurbSimInput[27]
-                flag = line_text.split()[0]
-                if flag != '0':
-                    TurbSimInput[27] = line_text.replace(flag,'0')
-                    print('HFlowAng is set 0, otherwise it will cause errors in the 4D wind field generation.') 
-                del line_text,flag
+            # Check and set the flag of the vertical mean flow (uptilt) angle 
+            # and the Horizontal mean flow (skew) angle as 0
+            # because the current evoTurb does not support it      
+            line_text = TurbSimInput[26]
+            flag = line_text.split()[0]
+            if flag != '0':
+                TurbSimInput[26] = line_text.replace(flag,'0')
+                print('VFlowAng is set 0, otherwise it will cause errors in the 4D wind field generation.')
+            del line_text,flag
+            
+            line_text = TurbSimInput[27]
+            flag = line_text.split()[0]
+            if flag != '0':
+                TurbSimInput[27] = line_text.replace(flag,'0')
+                print('HFlowAng is set 0, otherwise it will cause errors in the 4D wind field generation.') 
+            del line_text,flag
+            
+            # check if 3D wind field exists, in the store or in 3DTurb_Kaimal
+            Extensions = ['.sum','.wnd']
+            if Store:
+                StoreKeys[i] = Store3DKey('TurbSim',ConfigParameters['exeDir'],''.join(TurbSimInput),ConfigParameters['Seeds'][i])
+                Path3D[i] = LookupStore3D(Store,StoreKeys[i],SimulationNames3D[i],Extensions,ConfigParameters.get('Store3DVerify',False))
+                finalDir  = os.path.join(Store,StoreKeys[i])
+            else:
+                finalDir  = ConfigParameters['saveDir_3D']
+                if os.path.isfile(os.path.join(finalDir,SimulationNames3D[i]+'.wnd')):
+                    Path3D[i] = os.path.join(finalDir,SimulationNames3D[i])
+            
+            if Path3D[i] is None:
                 
                 # save the modified input file 
                 thisTurbSimInput = os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+'.inp')
                 with open(thisTurbSimInput,'w') as f2write:
                     f2write.writelines(TurbSimInput)
                 
-                # call TurbSim exe if the 3D wind fields do not exist
-                print('Generating '+SimulationNames3D[i])
-                subprocess.run(ConfigParameters['exeDir']+' '+thisTurbSimInput)   #bug!!                  
-                
-                # Move .wnd and .sum files to 3DTurb_Kaimal
-                shutil.move(os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+'.wnd'),\
-                            os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'.wnd'))
-                shutil.move(os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+'.sum'),\
-                            os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'.sum'))
+                # queue TurbSim if the 3D wind fields do not exist, TurbSim writes 
+                # .wnd and .sum next to the input file, they are moved to 3DTurb_Kaimal 
+                # or the store once complete
+                os.makedirs(finalDir,exist_ok=True)
+                SimJobs.append({'Name': SimulationNames3D[i],
+                                'Command': [ConfigParameters['exeDir'],thisTurbSimInput],
+                                'Outputs': [(os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+ext),\
+                                             os.path.join(finalDir,SimulationNames3D[i]+ext)) for ext in Extensions],
+                                'Size': [None,None],
+                                'Store': (Store,StoreKeys[i],Extensions) if Store else None})
+                Path3D[i] = os.path.join(finalDir,SimulationNames3D[i])
                     
-                del TurbSimInput,thisTurbSimInput,f2read,f2write
+                del thisTurbSimInput,f2write
             
             else:                        
                 print('3D wind field exists: '+SimulationNames3D[i])
+            
+            del TurbSimInput,f2read
        
     elif ConfigParameters['TurbModel'] == 'Mann':   
      
@@ -122,38 +200,177 @@ def Execute3DSim(ConfigParameters):
                                     '_dy'+'{0:g}'.format(ConfigParameters['dy']).replace('.','d')+\
                                     '_dz'+'{0:g}'.format(ConfigParameters['dz']).replace('.','d')+\
                                     '_Seed'+'{0:g}'.format(ConfigParameters['Seeds'][i])
+            
+            if Native:
+                continue
                                     
-            # check if 3D wind field exists
-            if not all([os.path.isfile(os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'_u.bin')),\
-                        os.path.isfile(os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'_v.bin')),\
-                        os.path.isfile(os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]+'_w.bin'))]):     
-            
-                # modify the input files for MTG           
-                with open(ConfigParameters['SimInitialInputDir']) as f2read:
-                    MTGInput = f2read.read().split()  
-                
-                MTGInput[0] = ConfigParameters['exeDir'] # first input: the directory of the .exe file
-                MTGInput[1] = os.path.join(ConfigParameters['saveDir_3D'],SimulationNames3D[i]) # second input: the directory of the .bin files
-                MTGInput[5] = str(ConfigParameters['Seeds'][i]) # modify the random seed in the input file of MTG 
-                MTGInput = " ".join(MTGInput)
+            # modify the input files for MTG           
+            with open(ConfigParameters['SimInitialInputDir']) as f2read:
+                MTGInput = f2read.read().split()  
+            
+            MTGInput[0] = ConfigParameters['exeDir'] # first input: the directory of the .exe file
+            MTGInput[1] = os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]) # second input: the directory of the .bin files, moved to 3DTurb_Mann or the store once complete
+            MTGInput[5] = str(ConfigParameters['Seeds'][i]) # modify the random seed in the input file of MTG 
+            
+            # check if 3D wind field exists, in the store or in 3DTurb_Mann
+            Extensions = ['_u.bin','_v.bin','_w.bin']
+            if Store:
+                # the key does not depend on the location of the .exe and the output files
+                StoreKeys[i] = Store3DKey('MTG',ConfigParameters['exeDir'],' '.join(MTGInput[2:]),ConfigParameters['Seeds'][i])
+                Path3D[i] = LookupStore3D(Store,StoreKeys[i],SimulationNames3D[i],Extensions,ConfigParameters.get('Store3DVerify',False))
+                finalDir  = os.path.join(Store,StoreKeys[i])
+            else:
+                finalDir  = ConfigParameters['saveDir_3D']
+                if all([os.path.isfile(os.path.join(finalDir,SimulationNames3D[i]+ext)) for ext in Extensions]):
+                    Path3D[i] = os.path.join(finalDir,SimulationNames3D[i])
+            
+            if Path3D[i] is None:     
                 
                 # save the modified input file 
                 thisBatch = os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+'.bat')
                 with open(thisBatch,'w') as f2write:
-                    f2write.write(MTGInput)
+                    f2write.write(" ".join(MTGInput))
                 
-                # call batch file to run MTG if the 3D wind fields do not exist
-                print('Generating '+SimulationNames3D[i])
-                subprocess.run(thisBatch)     
+                # queue the batch file to run MTG if the 3D wind fields do not exist
+                os.makedirs(finalDir,exist_ok=True)
+                SimJobs.append({'Name': SimulationNames3D[i],
+                                'Command': [thisBatch],
+                                'Outputs': [(os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimulationNames3D[i]+ext),\
+                                             os.path.join(finalDir,SimulationNames3D[i]+ext)) for ext in Extensions],
+                                'Size': [4*int(ConfigParameters['Nt'])*ConfigParameters['Ny']*ConfigParameters['Nz']]*3,
+                                'Store': (Store,StoreKeys[i],Extensions) if Store else None})
+                Path3D[i] = os.path.join(finalDir,SimulationNames3D[i])
                 
-                del MTGInput,f2read,f2write
+                del thisBatch,f2write
             
             else:                        
                 print('3D wind field exists: '+SimulationNames3D[i])
+            
+            del MTGInput,f2read
         
     # name the 4D wind field ending with the first and the last random seed
     ConfigParameters['SimulationName4D']  = SimulationNames3D[0]+'_'+str(ConfigParameters['Seeds'][-1])
     # save the names of the 3D wind fields
     ConfigParameters['SimulationName3D']  = SimulationNames3D  
+    ConfigParameters['Path3D']            = Path3D
+    ConfigParameters['StoreKeys3D']       = StoreKeys
       
-    return ConfigParameters      
\ No newline at end of file
+    return ConfigParameters,SimJobs
+
+
+def RunSimJobs(ConfigParameters,SimJobs):
+    
+    if not SimJobs:
+        return
+    
+    NumWorkers = ConfigParameters.get('NumWorkers3D',None) or os.cpu_count() or 1
+    NumWorkers = max(1,min(NumWorkers,len(SimJobs)))
+    
+    with ThreadPoolExecutor(max_workers=NumWorkers) as pool:
+        results = list(pool.map(lambda SimJob: RunSimJob(ConfigParameters,SimJob),SimJobs))
+    
+    failed = [SimJob for SimJob,success in zip(SimJobs,results) if not success]
+    if failed:
+        raise RuntimeError('3D simulation failed: '+', '.join([SimJob['Name'] for SimJob in failed])+\
+                           '. Please check the log files in '+ConfigParameters['saveDir_SimInputFiles'])
+
+
+def RunSimJob(ConfigParameters,SimJob):
+    
+    Timeout  = ConfigParameters.get('SimTimeout',None)
+    Retries  = ConfigParameters.get('SimRetries',0)
+    logFile  = os.path.join(ConfigParameters['saveDir_SimInputFiles'],SimJob['Name']+'.log')
+    
+    for attempt in range(Retries+1):
+        
+        # remove outputs of a previous crashed run
+        for staged,_ in SimJob['Outputs']:
+            if os.path.isfile(staged):
+                os.remove(staged)
+        
+        print('Generating '+SimJob['Name']+('' if attempt == 0 else ' (retry '+str(attempt)+')'))
+        
+        # capture stdout and stderr in the log file
+        with open(logFile,'w' if attempt == 0 else 'a') as log:
+            try:
+                # the jobs run in worker threads, the stage name is absolute
+                with Stage('/Execute3DSim/Run3DSim') as stage:
+                    process = subprocess.Popen(SimJob['Command'],stdout=log,stderr=subprocess.STDOUT,**NewProcessGroup)
+                    try:
+                        returncode,CPU = WaitProcess(process,Timeout)
+                    except subprocess.TimeoutExpired:
+                        # the generator may be a child of the batch file, it must not write
+                        # the outputs any more when they are removed for the retry
+                        CPU = KillProcessTree(process)
+                        raise
+                    finally:
+                        stage.AddChildCPU(CPU)
+            except subprocess.TimeoutExpired:
+                log.write('\nTimeout after '+str(Timeout)+' s\n')
+                continue
+            except OSError as err:
+                log.write('\n'+str(err)+'\n')
+                continue
+            
+        # check if all outputs are complete
+        complete = returncode == 0 and all([os.path.isfile(staged) and (size is None or os.path.getsize(staged) == size) \
+                                            for (staged,_),size in zip(SimJob['Outputs'],SimJob['Size'])])
+        if complete:
+            # move the outputs, the last one is the file checked for existence
+            for staged,final in SimJob['Outputs']:
+                shutil.move(staged,final+'.tmp')
+                os.replace(final+'.tmp',final)
+            # the entry in the store is complete once its manifest exists
+            if SimJob.get('Store',None):
+                WriteManifest(SimJob['Store'][0],SimJob['Store'][1],SimJob['Name'],SimJob['Store'][2])
+            return True
+    
+    print('Failed to generate '+SimJob['Name']+', see '+logFile)
+    return False
+
+
+# each 3D simulation is started in its own process group
+if os.name == 'nt':
+    NewProcessGroup = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    NewProcessGroup = {'start_new_session': True}
+
+
+def WaitProcess(process,Timeout):
+    
+    # return code and CPU time [s] of the process and its finished children, from its own
+    # resource usage (the process-wide usage includes the runs of the other workers)
+    if not hasattr(os,'wait4'):
+        return process.wait(timeout=Timeout),None   # Windows
+    
+    Deadline = None if Timeout is None else time.monotonic()+Timeout
+    Delay = 0.001
+    while True:
+        pid,status,usage = os.wait4(process.pid,os.WNOHANG)
+        if pid:
+            process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            return process.returncode,usage.ru_utime+usage.ru_stime
+        if Deadline is not None and time.monotonic() > Deadline:
+            raise subprocess.TimeoutExpired(process.args,Timeout)
+        time.sleep(Delay)
+        Delay = min(2*Delay,0.05)
+
+
+def KillProcessTree(process):
+    
+    # returns the CPU time [s] of the killed process, None if it is not available
+    if os.name == 'nt':
+        subprocess.run(['taskkill','/T','/F','/PID',str(process.pid)],stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        process.kill()
+        process.wait()
+        return None
+    
+    # the process group has the id of the started process, the killed processes
+    # do not write anything after the signal
+    try:
+        os.killpg(process.pid,signal.SIGKILL)
+    except OSError:
+        pass
+    _,status,usage = os.wait4(process.pid,0)
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return usage.ru_utime+usage.ru_stime
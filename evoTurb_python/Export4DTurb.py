@@ -18,6 +18,8 @@ Outputs
 2. the corresponding 3D wind field file(s) for the rotor plane 
    - 'Kaimal':'*_rotor.wnd' 
    - 'Mann': '*_rotor_u.bin', '*_rotor_v.bin', and '*_rotor_w.bin'
+   copied from the 3D wind field of the first plane, or written from the rotor plane of 
+   the 4D wind field if it was simulated without file (ConfigParameters['Backend3D'] = 'native')
 -----------------------------------------------------------------------------
 Created on 22.06.2021 
 Yiyin Chen    (c) University of Stuttgart 
@@ -31,54 +33,69 @@ Modified
 import shutil
 import os
 import numpy as np
+from EvoFile import EvoWriter
+from Store3DTurb import PlanePath
+from writeBLgrid import writeBLgrid
 
 def Export4DTurb(ConfigParameters,TurbData4D):
 
-    if ConfigParameters['TurbModel']=='Kaimal':
+    if ConfigParameters.get('Backend3D','exe') == 'native' and ConfigParameters['TurbModel']=='Kaimal':
+        # write the rotor plane with the binary scale and offset of the .evo file,
+        # size of the .wnd data: (time, velocity component, iy, iz)
+        velocity = np.stack([np.transpose(TurbData4D[comp][:,:,:,0],(2,1,0)) for comp in ['U','V','W']],axis=1)
+        writeBLgrid(os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor'),velocity,\
+                    ConfigParameters['Lz']/(ConfigParameters['Nz']-1),ConfigParameters['Ly']/(ConfigParameters['Ny']-1),\
+                    ConfigParameters['dt'],ConfigParameters['Href'],True,ConfigParameters['binary_Scale'],ConfigParameters['binary_Offset'])
+        del velocity
+    elif ConfigParameters['TurbModel']=='Kaimal':
         # copy the 3D wind field for the rotor plane
-        shutil.copyfile(os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][0]+'.wnd'),\
+        shutil.copyfile(PlanePath(ConfigParameters,0)+'.wnd',\
             os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor.wnd'))    
+    elif ConfigParameters.get('Backend3D','exe') == 'native':
+        # write the rotor plane as float32 boxes with size of (Nx,Ny,Nz) in C order, 
+        # flipped back in x and y as the .bin files of MTG
+        for comp in ['U','V','W']:
+            np.ascontiguousarray(np.transpose(TurbData4D[comp][:,:,:,0],(2,1,0))[::-1,::-1,:],dtype=np.float32).tofile(\
+                os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor_'+comp.lower()+'.bin'))
+        # offset and scale parameters for binary files
+        ConfigParameters['binary_Offset'] = np.zeros((3,1))
+        ConfigParameters['binary_Scale'] = ConfigParameters['gamma']/1000*np.ones((3,1))
     elif ConfigParameters['TurbModel']=='Mann':
         # copy the 3D wind field for the rotor plane
-        shutil.copyfile(os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][0]+'_u.bin'),\
+        shutil.copyfile(PlanePath(ConfigParameters,0)+'_u.bin',\
             os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor_u.bin'))     
-        shutil.copyfile(os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][0]+'_v.bin'),\
+        shutil.copyfile(PlanePath(ConfigParameters,0)+'_v.bin',\
             os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor_v.bin'))  
-        shutil.copyfile(os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][0]+'_w.bin'),\
+        shutil.copyfile(PlanePath(ConfigParameters,0)+'_w.bin',\
             os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][0]+'_rotor_w.bin'))  
         # offset and scale parameters for binary files
         ConfigParameters['binary_Offset'] = np.zeros((3,1))
         ConfigParameters['binary_Scale'] = ConfigParameters['gamma']/1000*np.ones((3,1))
 
            
-    # apply binary scale and offset 
-    ubin  = np.int16((TurbData4D['U']-ConfigParameters['binary_Offset'][0])/ConfigParameters['binary_Scale'][0])
-    vbin  = np.int16((TurbData4D['V']-ConfigParameters['binary_Offset'][1])/ConfigParameters['binary_Scale'][1])
-    wbin  = np.int16((TurbData4D['W']-ConfigParameters['binary_Offset'][2])/ConfigParameters['binary_Scale'][2])
-    
-    # export the unfrozen planes except the turbine plane
-    data2export = np.stack((ubin[:,:,:,1:],vbin[:,:,:,1:],wbin[:,:,:,1:]),axis=4)    
-    data2export = np.transpose(data2export,(2,4,1,0,3))    
+    Nt       = int(ConfigParameters['Nt'])
+    Ny       = ConfigParameters['Ny'] 
+    Nz       = ConfigParameters['Nz']   
+    Nplanes  = ConfigParameters['Nplanes']
     
     print('Exporting 4D wind field as binary files...')
             
     fid = os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName4D']+'_upstream.evo')
-    with open(fid,'wb') as f2write:
-        # write the head line with the number of unfrozen planes
-        # write the x positions of unfrozen planes
-        array2write = np.append(ConfigParameters['Nplanes']-1, ConfigParameters['Xpos'][1:])
-        np.array(np.int16(array2write)).tofile(f2write)
-        # write 4D wind field
-        np.array(np.reshape(data2export,(-1,1),order="F")).tofile(f2write) 
+    
+    # export the unfrozen planes except the turbine plane, the binary scale and 
+    # offset are applied to one plane or time chunk at a time
+    with EvoWriter(fid,ConfigParameters['Xpos'][1:],Ny,Nz,Nt,ConfigParameters['binary_Scale'],ConfigParameters['binary_Offset']) as Writer:
         
-    print('Binary file exported!')
-
-
-
-
-
-
-
-
-
-
+        if ConfigParameters.get('MemoryBudget',None):
+            # memory-mapped fields are read in time chunks: about 18 bytes per value 
+            # (float64 input, scaled copy, and int16 output)
+            NtChunk = int(max(1,ConfigParameters['MemoryBudget']//(18*3*Nz*Ny*max(1,Nplanes-1))))
+            for it in range(0,Nt,NtChunk):
+                Writer.WriteTimeChunk(it,TurbData4D['U'][:,:,it:it+NtChunk,1:],\
+                                         TurbData4D['V'][:,:,it:it+NtChunk,1:],\
+                                         TurbData4D['W'][:,:,it:it+NtChunk,1:])
+        else:
+            for i in range(1,Nplanes):
+                Writer.WritePlane(i-1,TurbData4D['U'][:,:,:,i],TurbData4D['V'][:,:,:,i],TurbData4D['W'][:,:,:,i])
+        
+    print('Binary file exported!')
\ No newline at end of file
@@ -16,6 +16,19 @@ Outputs
 TurbData4D: -dict, 4D wind data
             three fields *.U, *.V, and *.W storing the three wind components
             each field is a 4D array with size of (Nz,Ny,Nt,Nplanes)
+            If ConfigParameters['MemoryBudget'] is set, the grid points are unfreezed in blocks
+            and U (and W for Mann) are memory-mapped arrays in a temporary folder of 
+            ConfigParameters['saveDir_4D'] (ConfigParameters['Scratch4D']), which is removed by
+            RemoveScratch4D (on POSIX already here, the arrays stay valid). If 
+            ConfigParameters['Keep4DArrays'] is True, they are kept in ConfigParameters['saveDir_4D']
+            as '*_U.npy' (and '*_W.npy')
+            If ConfigParameters['Precision'] is 'single', the FFT and the mixing are done in 
+            float32/complex64 and, if ConfigParameters['PrecisionCheck'] is True, the deviation
+            from double precision is saved in ConfigParameters['PrecisionError'] in units of 
+            the int16 quantisation step of the .evo file
+            If ConfigParameters['SaveSpectra'] is True, the Fourier coefficients of each 3D wind 
+            field (u fluctuation, and w for Mann) are saved in ConfigParameters['saveDir_4D'] as
+            '*_U_spectrum.npy' (and '*_W_spectrum.npy'), they are reused by #Append4DTurb.py#
 ------------------------------------------------------------------------------------
 Created on 19.11.2020 
 Feng Guo      (c) Flensburg University of Applied Sciences
@@ -27,7 +40,12 @@ Modified
 
 # import libirary
 import numpy as np
-from CalcCohx import CalcCohx
+import os
+import shutil
+import tempfile
+import warnings
+from CalcHx import CalcHx
+from StageTimer import Stage
 
 
 def Generate4DTurb(ConfigParameters,TurbData3D):
@@ -38,64 +56,218 @@ def Generate4DTurb(ConfigParameters,TurbData3D):
     Nplanes  = ConfigParameters['Nplanes']
     nf = len(ConfigParameters['f']) # number of frequency
     
-    # calculate longitudinal coherence for the u component
-    Cohx_u,ConfigParameters = CalcCohx(ConfigParameters) 
-       
-    # Cholesky decomposition
-    Hx_u = np.empty((Nplanes,Nplanes,nf))
-    Hx_u[:] = np.NaN
-    
-    for i in range(nf):
-        Hx_u[:,:,i] = np.linalg.cholesky(Cohx_u[:,:,i])
+    # Cholesky factors of the longitudinal coherence for the u component, size: (nf,Nplanes,Nplanes)
+    Hx_u,ConfigParameters = CalcHx(ConfigParameters) 
     
     print('Turbulence unfreezing started...')
     
+    if ConfigParameters.get('MemoryBudget',None):
+        
+        # out-of-core: unfreeze blocks of grid points and write the results to 
+        # memory-mapped .npy files in saveDir_4D
+        NzChunk = ChunkSize(ConfigParameters['MemoryBudget'],Ny,Nt,Nplanes,TurbData3D['U'].dtype.itemsize)
+        print('Unfreezing '+str(NzChunk)+' of '+str(Nz)+' grid rows at a time...')
+        
+        U_xyz = ApplyCohxChunked(Hx_u,TurbData3D['U'],nf,NzChunk,True,ArrayFile4D(ConfigParameters,'U'),\
+                                 OpenSpectra(ConfigParameters,'U',TurbData3D['U'].dtype))
+        if ConfigParameters['TurbModel'] == 'Mann':  
+            W_xyz = ApplyCohxChunked(Hx_u,TurbData3D['W'],nf,NzChunk,False,ArrayFile4D(ConfigParameters,'W'),\
+                                     OpenSpectra(ConfigParameters,'W',TurbData3D['W'].dtype))
+        else:
+            W_xyz = TurbData3D['W']
+        RemoveScratch4D(ConfigParameters)
+        
+        TurbData4D = {"U": U_xyz,"V": TurbData3D['V'],"W" :W_xyz}
+        
+        if ConfigParameters.get('Precision','double') == 'single' and ConfigParameters.get('PrecisionCheck',True):
+            ConfigParameters = CheckPrecision(ConfigParameters,Hx_u,TurbData3D,TurbData4D,nf)
+        
+        print('4D turbulence simulation finished!')
+        return TurbData4D,ConfigParameters
+    
     # Get the mean value of the u component
     U_yz_mean = np.mean(TurbData3D['U'],axis=2,keepdims=True) 
     # fluctuation of the u component 
     u_yz = TurbData3D['U']-U_yz_mean              
-    # two sided Fourier coefficient u 
-    FC_yz_u_2side = np.fft.fft(np.reshape(np.transpose(u_yz,(3,0,1,2)),(Nplanes*Ny*Nz,Nt), order="F"),axis=1)       
-    # one sided Fourier coefficient u   
-    FC_yz_u_1side = np.reshape(FC_yz_u_2side[:,0:nf],(Nplanes,Ny*Nz,nf),order="F")
-    
-    # introduce the longitudinal coherence in the 3D wind fields        
-    FC_xyz_u = np.empty((Nplanes,Ny*Nz,nf),dtype=complex)
-    FC_xyz_u[:] = np.NaN
-    for i in range(nf):
-        FC_xyz_u[:,:,i] = Hx_u[:,:,i]@FC_yz_u_1side[:,:,i]
-    
-    # apply iFFT 
-    u_xyz = np.fft.irfft(np.reshape(FC_xyz_u,(Nplanes*Ny*Nz,nf),order="F"),n=2*nf,axis=1)       
-    # add the mean value
-    U_xyz = np.transpose(np.reshape(u_xyz,(Nplanes,Nz,Ny,Nt),order="F"),(1,2,3,0)) + U_yz_mean
+    # introduce the longitudinal coherence in the 3D wind fields and add the mean value
+    U_xyz = ApplyCohx(Hx_u,u_yz,nf,OpenSpectra(ConfigParameters,'U',u_yz.dtype)) + U_yz_mean
+    del u_yz
     
     # For MTG, the same coherence will also applied to the w component to keep
     # the coherence betwenn u and w component unchanged.
     if ConfigParameters['TurbModel'] == 'Mann':  
-                     
-        # two sided Fourier coefficient u 
-        FC_yz_w_2side = np.fft.fft(np.reshape(np.transpose(TurbData3D['W'],(3,0,1,2)),(Nplanes*Ny*Nz,Nt), order="F"),axis=1)      
-        # one sided Fourier coefficient u   
-        FC_yz_w_1side = np.reshape(FC_yz_w_2side[:,0:nf],(Nplanes,Ny*Nz,nf), order="F")
-    
-        # introduce the longitudinal coherence in the 3D wind fields  
-        FC_xyz_w = np.empty((Nplanes,Ny*Nz,nf),dtype=complex)
-        FC_xyz_w[:] = np.NaN   
-        for i in range(nf):
-            FC_xyz_w[:,:,i] = Hx_u[:,:,i]@FC_yz_w_1side[:,:,i] 
-            
-        # apply iFFT 
-        w_xyz = np.fft.irfft(np.reshape(FC_xyz_w,(Nplanes*Ny*Nz,nf),order="F"),n=2*nf,axis=1)       
-        # add the mean value
-        W_xyz = np.transpose(np.reshape(w_xyz,(Nplanes,Nz,Ny,Nt),order="F"),(1,2,3,0))
+        
+        # the Cholesky factors of the u component are reused
+        W_xyz = ApplyCohx(Hx_u,TurbData3D['W'],nf,OpenSpectra(ConfigParameters,'W',TurbData3D['W'].dtype))
         
     else:
         W_xyz = TurbData3D['W']   
     
     # output structure for the 4D wind field
     TurbData4D = {"U": U_xyz,"V": TurbData3D['V'],"W" :W_xyz}
+    
+    if ConfigParameters.get('Precision','double') == 'single' and ConfigParameters.get('PrecisionCheck',True):
+        ConfigParameters = CheckPrecision(ConfigParameters,Hx_u,TurbData3D,TurbData4D,nf)
         
     print('4D turbulence simulation finished!')
     return TurbData4D,ConfigParameters
+
+
+def ApplyCohx(Hx,data,nf,Spectra=None):
+    
+    # data: 4D array with size of (Nz,Ny,Nt,Nplanes)
+    # Hx: Cholesky factors of the longitudinal coherence with size of (nf,Nplanes,Nplanes)
+    # Spectra: None or list of arrays with size of (Ny*Nz,nf) to save the Fourier coefficients of each plane
+    Nz,Ny,Nt,Nplanes = np.shape(data)
+    fft = FFTModule(data.dtype)
+    Hx  = np.asarray(Hx,dtype=data.dtype)
+    
+    # one sided Fourier coefficients of the real input, only the bins 0...Nt/2 
+    # are computed, size: (Ny*Nz,nf+1,Nplanes)
+    with Stage('FFT'):
+        FC_yz = fft.rfft(np.reshape(data,(Nz*Ny,Nt,Nplanes)),axis=1)
+    
+    if Spectra is not None:
+        for i in range(Nplanes):
+            Spectra[i][:] = FC_yz[:,0:nf,i]
+    
+    # introduce the longitudinal coherence for all frequencies as one stacked 
+    # matrix product, size: (nf,Ny*Nz,Nplanes). The DC bin is mixed with the 
+    # factor of the first frequency as in the two sided version. 
+    with Stage('Mixing'):
+        FC_yz[:,0:nf,:] = np.transpose(np.matmul(np.transpose(FC_yz[:,0:nf,:],(1,0,2)),np.transpose(Hx,(0,2,1))),(1,0,2))
+        # the Nyquist bin is not mixed and set to zero
+        FC_yz[:,nf:,:] = 0
+    
+    # apply iFFT 
+    with Stage('iFFT'):
+        data_xyz = fft.irfft(FC_yz,n=2*nf,axis=1)
+    del FC_yz
+    
+    return np.reshape(data_xyz,(Nz,Ny,Nt,Nplanes))
+
+
+def FFTModule(dtype):
+    
+    # float32 input is transformed in single precision (complex64) with scipy,
+    # numpy's FFT always computes in double precision
+    if dtype == np.float32:
+        from scipy import fft
+        return fft
+    
+    return np.fft
+
+
+def SpectrumFile(ConfigParameters,i,comp):
+    
+    # the Fourier coefficients only depend on the 3D wind field of the i-th plane
+    return os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName3D'][i]+'_'+comp+'_spectrum.npy')
+
+
+def OpenSpectra(ConfigParameters,comp,dtype):
+    
+    # memory-mapped .npy files for the Fourier coefficients of all planes, 
+    # size: (Ny*Nz,nf) each, None if they are not saved
+    if not ConfigParameters.get('SaveSpectra',False):
+        return None
+    
+    CDtype = np.complex64 if dtype == np.float32 else np.complex128
+    Shape  = (ConfigParameters['Nz']*ConfigParameters['Ny'],len(ConfigParameters['f']))
+    
+    return [np.lib.format.open_memmap(SpectrumFile(ConfigParameters,i,comp),mode='w+',dtype=CDtype,shape=Shape) \
+            for i in range(ConfigParameters['Nplanes'])]
+
+
+def ApplyCohxChunked(Hx,field,nf,NzChunk,RemoveMean,outFile,Spectra=None):
+    
+    # field: 4D array, memory-mapped array or LazyField with size of (Nz,Ny,Nt,Nplanes)
+    # the coherence acts on each (y,z) point independently, so the field is 
+    # unfreezed in blocks of NzChunk rows of the grid 
+    Nz,Ny,Nt,Nplanes = np.shape(field)
+    out = np.lib.format.open_memmap(outFile,mode='w+',dtype=field.dtype,shape=(Nz,Ny,Nt,Nplanes))
+    
+    for iz in range(0,Nz,NzChunk):
+        data = np.asarray(field[iz:iz+NzChunk])
+        # the rows of the saved Fourier coefficients of this block
+        SpectraChunk = None if Spectra is None else [S[iz*Ny:(iz+NzChunk)*Ny] for S in Spectra]
+        if RemoveMean:
+            data_mean = np.mean(data,axis=2,keepdims=True)
+            out[iz:iz+NzChunk] = ApplyCohx(Hx,data-data_mean,nf,SpectraChunk) + data_mean
+        else:
+            out[iz:iz+NzChunk] = ApplyCohx(Hx,data,nf,SpectraChunk)
+        del data
+    
+    out.flush()
+    if Spectra is not None:
+        for S in Spectra:
+            S.flush()
+    return out
+
+
+def ArrayFile4D(ConfigParameters,comp):
+    
+    # the memory-mapped 4D arrays are only kept if they are requested, otherwise they
+    # are written to a temporary folder on the same disk as the .evo file
+    if ConfigParameters.get('Keep4DArrays',False):
+        return os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName4D']+'_'+comp+'.npy')
+    
+    if not ConfigParameters.get('Scratch4D',None):
+        ConfigParameters['Scratch4D'] = tempfile.mkdtemp(prefix='.'+ConfigParameters['SimulationName4D']+'_',\
+                                                         dir=ConfigParameters['saveDir_4D'])
+    return os.path.join(ConfigParameters['Scratch4D'],comp+'.npy')
+
+
+def RemoveScratch4D(ConfigParameters):
+    
+    # the mapped arrays stay valid if their files are removed on POSIX, on Windows 
+    # the files are only removed after the arrays are closed (e.g. after the export)
+    ScratchDir = ConfigParameters.get('Scratch4D',None)
+    if not ScratchDir:
+        return
+    shutil.rmtree(ScratchDir,ignore_errors=True)
+    if not os.path.isdir(ScratchDir):
+        ConfigParameters['Scratch4D'] = None
+
+
+def ChunkSize(MemoryBudget,Ny,Nt,Nplanes,ItemSize=8):
+    
+    # approximate peak memory of one grid point in #ApplyCohx.py#: the input block,
+    # its fluctuation, the one sided Fourier coefficients (about one real block each), 
+    # the mixed coefficients and their transposes, and the iFFT output
+    BytesPerPoint = 10*ItemSize*Nt*Nplanes
+    
+    return int(max(1,MemoryBudget//(BytesPerPoint*Ny)))
+
+
+def CheckPrecision(ConfigParameters,Hx,TurbData3D,TurbData4D,nf):
+    
+    # recalculate a few grid points in double precision and compare them with the
+    # single precision result, the error is given in units of the int16 quantisation
+    # step of the .evo file
+    Nz,Ny,Nt,Nplanes = np.shape(TurbData4D['U'])
+    if ConfigParameters['TurbModel'] == 'Mann':
+        Step = ConfigParameters['gamma']/1000*np.ones(3)
+    else:
+        Step = np.ravel(ConfigParameters['binary_Scale'])
+    
+    iz = np.unique(np.linspace(0,Nz-1,3).astype(int))
+    iy = np.unique(np.linspace(0,Ny-1,3).astype(int))
+    
+    Components = {'U': 0,'W': 2} if ConfigParameters['TurbModel'] == 'Mann' else {'U': 0}
+    Error = 0.0
+    for c,k in Components.items():
+        data = np.asarray(TurbData3D[c][iz],dtype=np.float64)[:,iy]
+        if c == 'U':
+            data_mean = np.mean(data,axis=2,keepdims=True)
+            ref = ApplyCohx(Hx,data-data_mean,nf) + data_mean
+        else:
+            ref = ApplyCohx(Hx,data,nf)
+        Error = max(Error,np.max(np.abs(np.asarray(TurbData4D[c][iz],dtype=np.float64)[:,iy]-ref))/Step[k])
+    
+    ConfigParameters['PrecisionError'] = Error
+    print('Single precision deviation: {:.3g} quantisation steps'.format(Error))
+    if Error >= 1:
+        warnings.warn('The single precision result deviates by more than one int16 quantisation step, '
+                      'set Precision to \'double\'.')
     
+    return ConfigParameters
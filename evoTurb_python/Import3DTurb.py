@@ -9,11 +9,16 @@ TurbData3D, ConfigParameters =  Import3DTurb(ConfigParameters)
 Inputs
 ConfigParameters: -dict, configuration parameters, output of the function #ExecuteSim.py#
                   binary files of 3D wind fields generated using TurbSim or MTG
+                  the planes are read in parallel with ConfigParameters['NumWorkersImport'] threads
 -----------------------------------------------------------------------------------------
 Outputs
 TurbData3D: -dict, independent 3D turbulence data at differnt yz planes
             three fields __['U'], __['V'], and __['W'] storing the three wind components
             each field is a 4D array with size of (Nz,Ny,Nt,Nplanes)
+            or a memory-mapped LazyField if ConfigParameters['LazyImport'] is True or 
+            ConfigParameters['MemoryBudget'] is set (see #Lazy3DTurb.py#)
+            If ConfigParameters['Backend3D'] is 'native', the 3D wind fields are simulated
+            in memory without any file (see #Simulate3DTurb.py#)
 ConfigParameters: -dict, configuration parameters 
 ----------------------------------------------------------------------------------
 Created on 19.11.2020 
@@ -27,83 +32,136 @@ Modified
 # import libirary
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
+from Store3DTurb import PlanePath
 from readBLgrid import readBLgrid
+from Lazy3DTurb import Lazy3DTurb
+from Simulate3DTurb import Simulate3DTurb
+from StageTimer import Stage
 
 def Import3DTurb(ConfigParameters):
     
-    # preallocate 4D array to save u, v, and w components, 
-    # size: (Nz,Ny,Nt,Nplanes)
-    U = np.empty((ConfigParameters['Nz'],ConfigParameters['Ny'],int(ConfigParameters['Nt']),ConfigParameters['Nplanes']))   
-    V = np.empty((ConfigParameters['Nz'],ConfigParameters['Ny'],int(ConfigParameters['Nt']),ConfigParameters['Nplanes']))  
-    W = np.empty((ConfigParameters['Nz'],ConfigParameters['Ny'],int(ConfigParameters['Nt']),ConfigParameters['Nplanes']))  
-    U[:] = np.NaN
-    V[:] = np.NaN
-    W[:] = np.NaN
+    # the native generator returns the 3D wind fields without writing them, e.g. 
+    # for the planes imported by #Append4DTurb.py#
+    if ConfigParameters.get('Backend3D','exe') == 'native':
+        return Simulate3DTurb(ConfigParameters)
+    
+    # map the binary files instead of reading them, the data is only read when indexed
+    if ConfigParameters.get('LazyImport',False) or ConfigParameters.get('MemoryBudget',None):
+        return Lazy3DTurb(ConfigParameters)
+    
+    # size: (Nz,Ny,Nt,Nplanes), float32 in the single precision mode
+    dtype = np.float32 if ConfigParameters.get('Precision','double') == 'single' else np.float64
+    Shape = (ConfigParameters['Nz'],ConfigParameters['Ny'],int(ConfigParameters['Nt']),ConfigParameters['Nplanes'])
+    
+    NumWorkers = ConfigParameters.get('NumWorkersImport',None) or os.cpu_count() or 1
+    NumWorkers = max(1,min(NumWorkers,ConfigParameters['Nplanes']))
     
     # read TurbSim .wnd files
     if ConfigParameters['TurbModel'] == 'Kaimal':  
         
-         for i in range(ConfigParameters['Nplanes']):
+         # preallocate 4D array to save u, v, and w components, every element is 
+         # written below
+         U = np.empty(Shape,dtype=dtype)   
+         V = np.empty(Shape,dtype=dtype)  
+         W = np.empty(Shape,dtype=dtype)  
+        
+         def ReadPlane(i):
        
              # u v w binary file name           
-             wndName   = os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i]+'.wnd')
+             wndName   = PlanePath(ConfigParameters,i)+'.wnd'
     
-             # read .wnd in python
-             velocity,_,_,_,_,_,_,_,_,_,_,Scale,Offset = readBLgrid(wndName)
-             U[:,:,:,i]           = np.transpose(np.squeeze(velocity[:,0,:,:]),(2,1,0))  
-             V[:,:,:,i]           = np.transpose(np.squeeze(velocity[:,1,:,:]),(2,1,0))   
-             W[:,:,:,i]           = np.transpose(np.squeeze(velocity[:,2,:,:]),(2,1,0))     
+             # read .wnd in python, the planes are read in worker threads
+             with Stage('/Import3DTurb/ReadPlane'):
+                 velocity,_,_,_,_,_,_,_,_,_,_,Scale,Offset = readBLgrid(wndName)
+                 U[:,:,:,i]           = np.transpose(velocity[:,0,:,:],(2,1,0))  
+                 V[:,:,:,i]           = np.transpose(velocity[:,1,:,:],(2,1,0))   
+                 W[:,:,:,i]           = np.transpose(velocity[:,2,:,:],(2,1,0))     
              
-             if i == 0:   # set the offset and Scale factor based on the first yz plane
-                 ConfigParameters['binary_Scale']            = Scale;
-                 ConfigParameters['binary_Offset']           = Offset;
-                
-             del wndName,velocity,Scale,Offset 
+             return Scale,Offset
+         
+         # the planes are read in parallel, each one fills its own slice of U, V, and W
+         with ThreadPoolExecutor(max_workers=NumWorkers) as pool:
+             Scale,Offset = list(pool.map(ReadPlane,range(ConfigParameters['Nplanes'])))[0]
+         
+         # set the offset and Scale factor based on the first yz plane
+         ConfigParameters['binary_Scale']            = Scale;
+         ConfigParameters['binary_Offset']           = Offset;
        
     # read MTG .bin files
     elif ConfigParameters['TurbModel'] == 'Mann':  
          
-         Nx                              = ConfigParameters['Nt'] 
+         Nx                              = int(ConfigParameters['Nt'])
          Ny                              = ConfigParameters['Ny'] 
          Nz                              = ConfigParameters['Nz'] 
+         Nplanes                         = ConfigParameters['Nplanes']
+         
+         # the .bin files are float32 in Fortran order (Nz,Ny,Nx), i.e. (Nx,Ny,Nz) in
+         # C order, so each file can be read directly into one slice of a buffer
+         # with size of (Nplanes,Nx,Ny,Nz). The flips to change the propagation 
+         # direction and the transpose to (Nz,Ny,Nt,Nplanes) are only views.
+         if dtype == np.float32:
+             buf = [np.empty((Nplanes,Nx,Ny,Nz),dtype=np.float32) for comp in range(3)]
+         else:
+             # in double precision, each file is read into a float32 plane buffer 
+             # and converted in one pass into the float64 output
+             U = np.empty(Shape,dtype=dtype)   
+             V = np.empty(Shape,dtype=dtype)  
+             W = np.empty(Shape,dtype=dtype) 
+             Out = (U,V,W)
   
-         for i in range(ConfigParameters['Nplanes']):
-                                                          
-             # u v w binary file name           
-             u_file = os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i]+'_u.bin')
-             v_file = os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i]+'_v.bin')
-             w_file = os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i]+'_w.bin')
+         def ReadPlane(i):
              
-             # read u v w binary and adjust the storage dimention
-             with open(u_file, 'rb') as fid:    
-                   dataRaw          = np.fromfile(fid,dtype=np.float32)
-                   dataRaw          = np.reshape(dataRaw, (Nz,Ny,Nx), order="F")
-                   # flip to change the propagation direction
-                   dataRaw          = np.flip(dataRaw,2) 
-                   dataRaw          = np.flip(dataRaw,1)
-                   U[:,:,:,i]       = dataRaw
-             del fid,dataRaw
-
-             with open(v_file, 'rb') as fid:    
-                   dataRaw          = np.fromfile(fid,dtype=np.float32)
-                   dataRaw          = np.reshape(dataRaw, (Nz,Ny,Nx), order="F")
-                   # flip to change the propagation direction
-                   dataRaw          = np.flip(dataRaw,2)
-                   dataRaw          = np.flip(dataRaw,1)
-                   V[:,:,:,i]       = dataRaw
-             del fid,dataRaw                   
-                   
-             with open(w_file, 'rb') as fid:    
-                   dataRaw          = np.fromfile(fid,dtype=np.float32)
-                   dataRaw          = np.reshape(dataRaw, (Nz,Ny,Nx), order="F")
-                   # flip to change the propagation direction
-                   dataRaw          = np.flip(dataRaw,2)
-                   dataRaw          = np.flip(dataRaw,1)
-                   W[:,:,:,i]       = dataRaw
-             del fid,dataRaw 
+             # the planes are read in worker threads, the stage name is absolute
+             with Stage('/Import3DTurb/ReadPlane'):
+                 ReadBinPlane(i)
+         
+         def ReadBinPlane(i):
+             
+             if dtype != np.float32:
+                 raw = np.empty((Nx,Ny,Nz),dtype=np.float32)
              
-             del u_file,v_file,w_file
+             for k,comp in enumerate(['u','v','w']):
+                 
+                 # u v w binary file name           
+                 binName = PlanePath(ConfigParameters,i)+'_'+comp+'.bin'
+                 
+                 if dtype == np.float32:
+                     readBin(binName,buf[k][i])
+                 else:
+                     readBin(binName,raw)
+                     Out[k][:,:,:,i] = FlipView(raw[np.newaxis])[...,0]
+         
+         # the planes are read in parallel, each one fills its own slice of the buffer
+         with ThreadPoolExecutor(max_workers=NumWorkers) as pool:
+             list(pool.map(ReadPlane,range(Nplanes)))
+                 
+         if dtype == np.float32:
+             U,V,W = [FlipView(b) for b in buf]
                    
     TurbData3D = {"U": U, "V": V, "W": W}
     
-    return TurbData3D,ConfigParameters
\ No newline at end of file
+    return TurbData3D,ConfigParameters
+
+
+def readBin(FileName,out):
+    
+    # read the binary file into the contiguous array out without any copy, 
+    # large files are returned by the OS in several parts
+    with open(FileName,'rb',buffering=0) as fid:
+        FileSize = os.fstat(fid.fileno()).st_size
+        if FileSize != out.nbytes:
+            raise ValueError('The size of '+FileName+' is '+str(FileSize)+' bytes, expected '+str(out.nbytes)+' bytes.')
+        mv = memoryview(out).cast('B')
+        nbytes = 0
+        while nbytes < out.nbytes:
+            n = fid.readinto(mv[nbytes:])
+            if not n:
+                raise ValueError('Unexpected end of file in '+FileName+'.')
+            nbytes += n
+
+
+def FlipView(buf):
+    
+    # buf: (Nplanes,Nx,Ny,Nz) -> (Nz,Ny,Nt,Nplanes) with reversed y and time
+    return np.transpose(buf[:,::-1,::-1,:],(3,2,1,0))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy3DTurb
+function: map the binary files of the 3D simulations in python without reading them
+--------------------------------------------------------------------------
+Usage
+TurbData3D, ConfigParameters =  Lazy3DTurb(ConfigParameters)
+------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters, output of the function #ExecuteSim.py#
+                  binary files of 3D wind fields generated using TurbSim or MTG
+-----------------------------------------------------------------------------------------
+Outputs
+TurbData3D: -dict, independent 3D turbulence data at differnt yz planes
+            three fields __['U'], __['V'], and __['W'] storing the three wind components
+            each field is a LazyField with size of (Nz,Ny,Nt,Nplanes)
+ConfigParameters: -dict, configuration parameters
+-----------------------------------------------------------------------------------------
+A LazyField behaves like a read-only 4D array: the .wnd (int16) and .bin (float32)
+files are memory-mapped and only the indexed part is read, scaled and flipped,
+e.g. TurbData3D['U'][:,:,0:100,1] reads the first 100 time steps of the second plane.
+np.asarray(TurbData3D['U']) reads the complete field.
+----------------------------------------------------------------------------------
+Created on 18.10.2026
+Feng Guo      (c) Flensburg University of Applied Sciences
+Yiyin Chen    (c) University of Stuttgart
+--------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+from Store3DTurb import PlanePath
+from readBLgrid import mapBLgrid
+
+
+class LazyField:
+
+    def __init__(self, planes, Scale=None, Offset=None, dtype=np.float64):
+
+        # planes: list of the raw (memory-mapped) views with size of (Nz,Ny,Nt)
+        # Scale, Offset: lists of the binary scale and offset of each plane, None for unscaled data
+        self.planes = planes
+        self.Scale  = Scale
+        self.Offset = Offset
+        self.dtype  = np.dtype(dtype)
+        self.shape  = tuple(planes[0].shape)+(len(planes),)
+        self.ndim   = 4
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __getitem__(self, key):
+
+        # expand the index to (iz, iy, it, iplane)
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),)*(self.ndim-len(key)+1) + key[i+1:]
+        key = key + (slice(None),)*(self.ndim-len(key))
+
+        iplanes = np.arange(self.shape[3])[key[3]]
+        if np.ndim(iplanes) == 0:
+            return self._read(int(iplanes), key[:3])
+
+        return np.stack([self._read(i, key[:3]) for i in iplanes], axis=-1)
+
+    def _read(self, i, key):
+
+        # only the indexed part of the plane is read from the disk
+        data = np.array(self.planes[i][key], dtype=self.dtype)
+        if self.Scale is not None:
+            data = data*self.Scale[i] + self.Offset[i]
+        return data
+
+
+def Lazy3DTurb(ConfigParameters):
+
+    Nplanes = ConfigParameters['Nplanes']
+    dtype   = np.float32 if ConfigParameters.get('Precision','double') == 'single' else np.float64
+    U = []
+    V = []
+    W = []
+
+    # map TurbSim .wnd files
+    if ConfigParameters['TurbModel'] == 'Kaimal':
+
+         Scale  = [[],[],[]]
+         Offset = [[],[],[]]
+
+         for i in range(Nplanes):
+
+             # u v w binary file name
+             wndName   = PlanePath(ConfigParameters,i)+'.wnd'
+
+             # map .wnd in python, velocity: (time, component, iy, iz)
+             velocity,Scale_i,Offset_i = mapBLgrid(wndName)
+             U.append(np.transpose(velocity[:,0,:,:],(2,1,0)))
+             V.append(np.transpose(velocity[:,1,:,:],(2,1,0)))
+             W.append(np.transpose(velocity[:,2,:,:],(2,1,0)))
+             for k in range(3):
+                 Scale[k].append(float(Scale_i[k]))
+                 Offset[k].append(float(Offset_i[k]))
+
+             if i == 0:   # set the offset and Scale factor based on the first yz plane
+                 ConfigParameters['binary_Scale']            = Scale_i;
+                 ConfigParameters['binary_Offset']           = Offset_i;
+
+         TurbData3D = {"U": LazyField(U,Scale[0],Offset[0],dtype),
+                       "V": LazyField(V,Scale[1],Offset[1],dtype),
+                       "W": LazyField(W,Scale[2],Offset[2],dtype)}
+
+    # map MTG .bin files
+    elif ConfigParameters['TurbModel'] == 'Mann':
+
+         Nx                              = ConfigParameters['Nt']
+         Ny                              = ConfigParameters['Ny']
+         Nz                              = ConfigParameters['Nz']
+
+         for i in range(Nplanes):
+
+             for comp,planes in zip(['u','v','w'],[U,V,W]):
+
+                 binName = PlanePath(ConfigParameters,i)+'_'+comp+'.bin'
+
+                 dataRaw = np.memmap(binName, dtype=np.float32, mode='r', shape=(Nz,Ny,Nx), order="F")
+                 # flip to change the propagation direction, no data is copied
+                 planes.append(dataRaw[:,::-1,::-1])
+
+         TurbData3D = {"U": LazyField(U,dtype=dtype), "V": LazyField(V,dtype=dtype), "W": LazyField(W,dtype=dtype)}
+
+    return TurbData3D,ConfigParameters
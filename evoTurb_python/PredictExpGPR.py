@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+PredictExpGPR
+function: predict the parameters of the wind evolution model 'Exp-GPR' with the Gaussian
+          process regression (GPR) models of the matlab version (ExpGPR.mat)
+------------------------------------------------------------------------------------
+Usage
+evo_a, evo_b = PredictExpGPR(ConfigParameters,r_x)
+Models = LoadExpGPR(FileName)
+y = PredictGPR(Model,Predictors)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters with Uref, sigma_u and sigma_w (see #CalcCohx.py#),
+                  the GPR models are read from ConfigParameters['GPRModel'], default
+                  evoTurb_matlab/GPR models/ExpGPR.mat of this repository
+r_x: -array, separations between the unfrozen planes [m]
+FileName: -string, the .mat file of the GPR models
+Model: -dict, one GPR model of the output of LoadExpGPR
+Predictors: -dict, the predictors of the model by name, scalars or arrays of the same size
+---------------------------------------------------------------------------------
+Outputs
+evo_a: -float, wind evolution model parameter a
+evo_b: -array, wind evolution model parameter b with the size of r_x, 0 for r_x = 0
+Models: -dict, the GPR models 'a' and 'b' (case 15 and case 17 in Table5 of Chen et al. 2021)
+y: -array, predicted mean values with the size of the predictors
+---------------------------------------------------------------------------------
+The models are CompactRegressionGP objects of matlab (exact GPR, ARD squared exponential
+kernel, constant basis function, standardized predictors). Scipy cannot convert matlab
+objects, so their properties are read from the subsystem of the .mat file (MCOS format).
+The models are read only once per process and prepared for the prediction (predictors of
+the active set divided by the length scales and the weights multiplied by the signal
+variance), so sweeps over many Uref and sigma only evaluate the kernel. The mean value of
+all predictions of a model is calculated with one kernel matrix, and evo_b is predicted
+once per unique separation.
+The model 'b' is the one with the predictor 'vlos_d' (separation).
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import io
+import os
+import numpy as np
+from CalcCohx import DefaultGPRModel
+
+# prepared models of the files read by this process, key: (file name, modification time)
+Models = {}
+
+
+def PredictExpGPR(ConfigParameters,r_x):
+
+    GPR = LoadExpGPR(ConfigParameters.get('GPRModel',None) or DefaultGPRModel)
+    Uref = ConfigParameters['Uref']
+
+    evo_a = PredictGPR(GPR['a'],{'V_long_mean': Uref,'V_vert_std': ConfigParameters['sigma_w'],'DirError': 0})
+
+    # evo_b only depends on the separation
+    rUnique,inverse = np.unique(r_x,return_inverse=True)
+    evo_b = PredictGPR(GPR['b'],{'V_long_mean': Uref,'V_long_TI_U': ConfigParameters['sigma_u']/Uref,
+                                 'V_long_skew': 0,'V_long_kurt': 0,'V_lat_skew': 0,'V_vert_skew': 0,
+                                 'vlos_d': rUnique})
+    evo_b[rUnique==0] = 0
+
+    return float(evo_a),np.reshape(evo_b[inverse],np.shape(r_x))
+
+
+def LoadExpGPR(FileName):
+
+    key = (os.path.abspath(FileName),os.path.getmtime(FileName))
+    if key in Models:
+        return Models[key]
+
+    GPR = {}
+    for obj in ReadMCOS(FileName):
+        if obj['Class'] != 'CompactRegressionGP':
+            continue
+        Impl  = obj['Impl']
+        Names = [str(np.ravel(name)[0]) for name in np.ravel(obj['DataSummary'][0,0]['PredictorNames'])]
+        if str(np.ravel(Impl['KernelFunction'])[0]) != 'ARDSquaredExponential' or \
+           str(np.ravel(Impl['BasisFunction'])[0]) not in {'Constant','None'}:
+            raise ValueError('Only GPR models with the kernel ARDSquaredExponential and a constant basis function are supported.')
+
+        # kernel parameters: log of the length scales of the predictors and of the signal standard deviation
+        Theta = np.exp(np.ravel(Impl['ThetaHat']))
+        Scale = 1/Theta[:-1]
+        if np.ravel(Impl['Standardize'])[0]:
+            Mu,Scale = np.ravel(Impl['StdMu']),Scale/np.ravel(Impl['StdSigma'])
+        else:
+            Mu = np.zeros(len(Names))
+        X = np.asarray(Impl['ActiveSetX'],dtype=np.float64)/Theta[:-1]
+        GPR['b' if 'vlos_d' in Names else 'a'] = {
+                'PredictorNames': Names,'Mu': Mu,'Scale': Scale,'X': X,
+                'X2': 0.5*np.sum(X**2,axis=1),
+                'Alpha': Theta[-1]**2*np.ravel(Impl['AlphaHat']),
+                'Beta': float(np.ravel(Impl['BetaHat'])[0]) if np.size(Impl['BetaHat']) else 0.0}
+
+    if set(GPR) != {'a','b'}:
+        raise ValueError('The file '+FileName+' does not contain the GPR models of evo_a and evo_b.')
+    Models[key] = GPR
+
+    return GPR
+
+
+def PredictGPR(Model,Predictors):
+
+    # predictors in the order of the training data, size: (number of predictions,number of predictors)
+    Values = np.broadcast_arrays(*[np.asarray(Predictors[name],dtype=np.float64) for name in Model['PredictorNames']])
+    Shape  = np.shape(Values[0])
+    z = (np.stack([np.ravel(v) for v in Values],axis=1)-Model['Mu'])*Model['Scale']
+
+    # ARD squared exponential kernel between the predictions and the active set
+    D = np.maximum(Model['X2']+0.5*np.sum(z**2,axis=1,keepdims=True)-z@Model['X'].T,0)
+    y = Model['Beta']+np.exp(-D)@Model['Alpha']
+
+    return np.reshape(y,Shape)
+
+
+def ReadMCOS(FileName):
+
+    # scipy is only imported if the models are read
+    import scipy.io as sio
+    try:
+        from scipy.io.matlab._mio5 import MatFile5Reader
+    except ImportError:
+        from scipy.io.matlab.mio5 import MatFile5Reader   # scipy < 1.8
+
+    # the matlab objects are saved as a MAT stream in the subsystem of the file,
+    # which scipy returns as bytes
+    Workspace = sio.loadmat(FileName,variable_names=['__function_workspace__'])['__function_workspace__'].tobytes()
+    Stream = io.BytesIO(b'MATLAB 5.0 MAT-file'.ljust(116,b' ')+b'\x00'*8+Workspace[:4]+Workspace[8:])
+    Reader = MatFile5Reader(Stream,struct_as_record=True,squeeze_me=False)
+    Reader.mat_stream.seek(128)
+    Reader.initialize_read()
+    Header,_ = Reader.read_var_header()
+    Cells = np.ravel(Reader.read_var_array(Header,process=True)[0,0]['MCOS']['arr'][0])
+
+    # the first cell describes the objects: version, number of names, offsets of the regions,
+    # names, classes, properties (two regions), and objects
+    Meta = np.ravel(Cells[0]).astype(np.uint8).tobytes()
+    nNames = int(np.frombuffer(Meta,np.uint32,1,4)[0])
+    Offset = np.frombuffer(Meta,np.uint32,8,8)
+    Names = Meta[40:Offset[0]].split(b'\x00')[:nNames]
+    Names = [''] + [name.decode() for name in Names]
+    Classes = np.frombuffer(Meta[Offset[0]:Offset[1]],np.uint32).reshape(-1,4)
+    Objects = np.frombuffer(Meta[Offset[2]:Offset[3]],np.uint32).reshape(-1,6)
+
+    def ReadProperties(start,end):
+        # per object: number of properties, then (name, type, value) of each property
+        Data = np.frombuffer(Meta[start:end],np.uint32)
+        Properties,i = [],0
+        while i < len(Data):
+            n = int(Data[i])
+            Properties.append(Data[i+1:i+1+3*n].reshape(-1,3))
+            i += 1+3*n
+            i += i % 2   # aligned to 8 bytes
+        return Properties
+    Properties = [ReadProperties(Offset[1],Offset[2]),ReadProperties(Offset[3],Offset[4])]
+
+    Out = []
+    for cls,_,_,seg1,seg2,_ in Objects[1:]:
+        obj = {'Class': Names[Classes[cls][1]]}
+        for name,kind,value in (Properties[0][seg1] if seg1 else Properties[1][seg2]):
+            # type 0: name, 1: value in the cells, 2: logical
+            obj[Names[name]] = Names[value] if kind == 0 else (Cells[value+2] if kind == 1 else bool(value))
+        Out.append(obj)
+
+    # references to other objects: [0xdd000000, 2, 1, 1, object, class]
+    for obj in Out:
+        for name,value in obj.items():
+            if isinstance(value,np.ndarray) and value.dtype == np.uint32 and np.size(value) == 6 and np.ravel(value)[0] == 0xdd000000:
+                obj[name] = Out[int(np.ravel(value)[4])-1]
+
+    return Out
@@ -52,6 +52,9 @@ def ReadTurbSimInput(ConfigParameters):
     # reference wind speed [m/s]    
     ConfigParameters['Uref'] = float(TurbSimInput[39].split()[0])
     
+    # Hub height [m], the centre of the grid
+    ConfigParameters['HubHt'] = float(TurbSimInput[23].split()[0])
+    
     # Height of the reference velocity (URef) [m]
     ConfigParameters['Href'] = float(TurbSimInput[38].split()[0])
     
@@ -67,5 +70,10 @@ def ReadTurbSimInput(ConfigParameters):
     # IEC turbulence class
     ConfigParameters['TurbClass'] = TurbSimInput[33].split()[0][1:-1]
     
+    # power law exponent of the wind profile, None = default of the IEC wind type,
+    # only used by the native generator (see #Simulate3DTurb.py#)
+    PLExp = TurbSimInput[41].split()[0]
+    ConfigParameters['PLExp'] = None if PLExp.lower() == 'default' else float(PLExp)
+    
     return ConfigParameters 
 
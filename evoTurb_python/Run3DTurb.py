@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Run3DTurb
+function: the 3D stage of the 4D wind field generation, hands the 3D wind fields of all
+          unfrozen planes to #Generate4DTurb.py# in memory
+------------------------------------------------------------------------------------
+Usage
+TurbData3D, ConfigParameters = Run3DTurb(ConfigParameters,Planned)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters, output of the function #TurbConfig.py#
+Planned: -bool, optional, True if the 3D wind fields are already named and simulated,
+         e.g. by the jobs of #Sweep.py#, default False
+---------------------------------------------------------------------------------
+Outputs
+TurbData3D: -dict, independent 3D turbulence data at differnt yz planes, input of the
+            function #Generate4DTurb.py#, see #Import3DTurb.py#
+ConfigParameters: -dict, configuration parameters
+---------------------------------------------------------------------------------
+ConfigParameters['Backend3D'] = 'native': the 3D wind fields are simulated in python
+(#Simulate3DTurb.py#) and returned without any file, only the names are set by
+#Execute3DSim.py#. The 3D files are a side output written if ConfigParameters['Save3D']
+is True.
+ConfigParameters['Backend3D'] = 'exe': TurbSim or MTG is run by #Execute3DSim.py# and
+the 3D wind fields are read from their files by #Import3DTurb.py#.
+The stages are recorded as 'Execute3DSim' and 'Simulate3DTurb' or 'Import3DTurb'
+(see #StageTimer.py#).
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+from Execute3DSim import Execute3DSim, PlanSimJobs
+from Import3DTurb import Import3DTurb
+from Simulate3DTurb import Simulate3DTurb
+from StageTimer import Stage
+
+
+def Run3DTurb(ConfigParameters,Planned=False):
+
+    if ConfigParameters.get('Backend3D','exe') == 'native':
+
+        # name the 3D wind fields and the 4D wind field, nothing is written
+        if not Planned:
+            with Stage('Execute3DSim'):
+                ConfigParameters,_ = PlanSimJobs(ConfigParameters)
+
+        with Stage('Simulate3DTurb'):
+            TurbData3D, ConfigParameters = Simulate3DTurb(ConfigParameters)
+
+    else:
+
+        # the generators write the 3D wind fields, they are read back from the files
+        if not Planned:
+            with Stage('Execute3DSim'):
+                ConfigParameters = Execute3DSim(ConfigParameters)
+
+        with Stage('Import3DTurb'):
+            TurbData3D, ConfigParameters = Import3DTurb(ConfigParameters)
+
+    return TurbData3D, ConfigParameters
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+SampleLidar
+function: sample the 4D wind field at the measurement points of a lidar, e.g. the beams
+          of a nacelle lidar at the unfrozen planes
+------------------------------------------------------------------------------------
+Usage
+Index = LidarIndex(ConfigParameters,x,y,z,t,Xpos)
+Samples = SampleLidar(Data,Index,LOS,Weights)
+y, z, t = LidarGrid(ConfigParameters)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters, output of the function #TurbConfig.py#
+x, y, z, t: -arrays of the same size (or broadcastable), coordinates of the points:
+            x upstream distance [m] as ConfigParameters['Xpos'], y lateral [m] and z vertical [m]
+            as the grid of the 3D wind fields (see LidarGrid), and t time [s]
+Xpos: -list, optional, x positions of the planes of Data, default ConfigParameters['Xpos'],
+      Reader.Xpos for a .evo file which does not contain the turbine plane
+Data: -dict, 4D wind field with the fields 'U', 'V', and 'W' with size of (Nz,Ny,Nt,Nplanes)
+      (output of #Generate4DTurb.py#) or an EvoReader of a .evo file (see #EvoFile.py#)
+LOS: -array, optional, unit vectors of the line of sight with size of (...,3), broadcastable
+     to the points, in the directions of u, v, and w
+Weights: -array, optional, weights of the points along the last axis, e.g. the range
+         weighting function of a pulsed lidar at the ranges of a probe volume
+---------------------------------------------------------------------------------
+Outputs
+Index: -dict, the grid indices and interpolation weights of the points, they only depend on
+       the points and can be reused for many 4D wind fields with the same grid
+Samples: -dict, the fields 'U', 'V', and 'W' (and 'LOS', the line-of-sight speed
+         LOS[...,0]*u+LOS[...,1]*v+LOS[...,2]*w, if LOS is given) with the size of the points,
+         or without the last axis if Weights is given (weighted average along it)
+y, z, t: -arrays, coordinates of the grid points of the 3D wind fields
+---------------------------------------------------------------------------------
+The wind speeds are interpolated linearly between the eight grid points in y, z, and time
+around each point on the two planes around it (16 values per point). The values are
+gathered with flat indices of the layout of Data, so only the needed values are read from
+a memory-mapped .evo file. The flat indices and the weights of the 16 values are calculated
+once for the three components, which are gathered together from a .evo file. About 1 million
+points per second are sampled on one core (LidarIndex and SampleLidar, float64 arrays), the 
+random gathers of the values take most of the time. Points outside the planes, the grid, 
+or the time of the wind field are NaN.
+The grid is centred at y = 0 and at the hub height HubHt for Kaimal (grid width Ly and grid
+height Lz as in TurbSim) and at z = 0 for Mann (spacing dy and dz as in MTG).
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+from EvoFile import EvoReader
+
+
+def LidarGrid(ConfigParameters):
+
+    Ny = ConfigParameters['Ny']
+    Nz = ConfigParameters['Nz']
+    if ConfigParameters['TurbModel'] == 'Kaimal':
+        y = np.linspace(-ConfigParameters['Ly']/2,ConfigParameters['Ly']/2,Ny)
+        z = ConfigParameters.get('HubHt',ConfigParameters['Href'])+np.linspace(-ConfigParameters['Lz']/2,ConfigParameters['Lz']/2,Nz)
+    else:
+        y = (np.arange(Ny)-(Ny-1)/2)*ConfigParameters['dy']
+        z = (np.arange(Nz)-(Nz-1)/2)*ConfigParameters['dz']
+    t = np.arange(int(ConfigParameters['Nt']))*ConfigParameters['dt']
+
+    return y,z,t
+
+
+def LidarIndex(ConfigParameters,x,y,z,t,Xpos=None):
+
+    x,y,z,t = np.broadcast_arrays(*[np.asarray(p,dtype=np.float64) for p in (x,y,z,t)])
+    Shape = np.shape(x)
+    Xpos = ConfigParameters['Xpos'] if Xpos is None else Xpos
+    yGrid,zGrid,tGrid = LidarGrid(ConfigParameters)
+
+    # lower grid index, upper grid index, and weight of the upper one along each axis
+    Index = {'Shape': Shape,'Nplanes': len(Xpos),'Ny': len(yGrid),'Nz': len(zGrid),'Nt': len(tGrid),
+             'Valid': np.ones(np.size(x),dtype=bool)}
+    for axis,p,grid in [('x',x,Xpos),('y',y,yGrid),('z',z,zGrid),('t',t,tGrid)]:
+        p    = np.ravel(p)
+        grid = np.asarray(grid,dtype=np.float64)
+        d    = np.diff(grid)
+        if len(grid) > 2 and np.allclose(d,d[0],rtol=1e-9,atol=0):
+            # evenly spaced grids (y, z, and t) without a search
+            w  = np.nan_to_num(np.clip((p-grid[0])/d[0],0,len(grid)-1),copy=False)
+            i0 = np.minimum(w.astype(np.intp),len(grid)-2)
+            i1 = i0+1
+            w -= i0
+        else:
+            i0 = np.clip(np.searchsorted(grid,p,side='right')-1,0,max(len(grid)-2,0))
+            i1 = np.minimum(i0+1,len(grid)-1)
+            with np.errstate(divide='ignore',invalid='ignore'):
+                w = np.where(i1 > i0,(p-grid[i0])/(grid[i1]-grid[i0]),0.0)
+        Index['Valid'] &= (p >= grid[0]) & (p <= grid[-1])
+        Index[axis] = (i0,i1,w)
+
+    return Index
+
+
+def SampleLidar(Data,Index,LOS=None,Weights=None):
+
+    if isinstance(Data,EvoReader):
+        # int16 values of the file with size of (Nplanes,Nz,Ny,3,Nt), scaled after the interpolation
+        Strides = {'x': Data.Nz*Data.Ny*3*Data.Nt,'z': Data.Ny*3*Data.Nt,'y': 3*Data.Nt,'t': 1}
+        Planes,Nz,Ny,Nt = Data.Nplanes,Data.Nz,Data.Ny,Data.Nt
+        Fields = {comp: (Data.Body,k*Data.Nt) for k,comp in enumerate(['U','V','W'])}
+    else:
+        # arrays with size of (Nz,Ny,Nt,Nplanes)
+        Nz,Ny,Nt,Planes = np.shape(Data['U'])
+        Strides = {'x': 1,'z': Ny*Nt*Planes,'y': Nt*Planes,'t': Planes}
+        Fields = {comp: (Data[comp],0) for comp in ['U','V','W']}
+
+    if (Planes,Nz,Ny,Nt) != (Index['Nplanes'],Index['Nz'],Index['Ny'],Index['Nt']):
+        raise ValueError('The grid of the 4D wind field does not match the index, please give the x positions of its planes to LidarIndex.')
+
+    # offsets of the 16 corners around a point from its lower corner along t, z, y, and x
+    # (none along an axis with a single grid point)
+    Axes    = ['t','z','y','x']
+    Sizes   = {'t': Nt,'z': Nz,'y': Ny,'x': Planes}
+    Corners = np.array(np.unravel_index(np.arange(16),(2,)*4))
+    Offsets = np.dot([Strides[axis]*(Sizes[axis] > 1) for axis in Axes],Corners)
+
+    # the points are interpolated in blocks, so the 16 values of each point stay in the cache
+    N       = len(Index['Valid'])
+    Samples = {comp: np.empty(N) for comp in ['U','V','W']}
+    for ib in range(0,N,65536):
+
+        # flat indices of the corners with size of (number of points,16) and their interpolation
+        # weights with size of (16,number of points), the same for all components
+        block  = slice(ib,ib+65536)
+        Flat   = sum([Index[axis][0][block]*Strides[axis] for axis in Axes])[:,np.newaxis]+Offsets
+        Weight = np.ones((1,len(Flat)))
+        for axis in Axes:
+            w      = Index[axis][2][block]
+            Weight = np.reshape(Weight[:,np.newaxis,:]*np.stack([1-w,w]),(-1,len(Flat)))
+
+        if isinstance(Data,EvoReader):
+            # the three components of the file are gathered together, size: (number of points,16,3)
+            value = Data.Body.reshape(-1)[Flat[...,np.newaxis]+[offset for _,offset in Fields.values()]]
+            for k,comp in enumerate(Fields):
+                Samples[comp][block] = np.einsum('nc,cn->n',value[...,k],Weight)
+        else:
+            for comp,(field,offset) in Fields.items():
+                # views (e.g. the flipped .bin files of MTG) are indexed without a copy
+                if field.flags['C_CONTIGUOUS']:
+                    value = field.reshape(-1)[Flat]
+                else:
+                    value = field[np.unravel_index(Flat,np.shape(field))]
+                Samples[comp][block] = np.einsum('nc,cn->n',value,Weight)
+
+    for k,comp in enumerate(['U','V','W']):
+        if isinstance(Data,EvoReader) and Data.Scale is not None:
+            Samples[comp] = Samples[comp]*Data.Scale[k]+Data.Offset[k]
+        Samples[comp][~Index['Valid']] = np.nan
+        Samples[comp] = np.reshape(Samples[comp],Index['Shape'])
+
+    if LOS is not None:
+        LOS = np.asarray(LOS,dtype=np.float64)
+        Samples['LOS'] = Samples['U']*LOS[...,0]+Samples['V']*LOS[...,1]+Samples['W']*LOS[...,2]
+
+    # weighted average along the last axis, e.g. the ranges of a probe volume
+    if Weights is not None:
+        Weights = np.broadcast_to(np.asarray(Weights,dtype=np.float64),Index['Shape'])
+        for key in list(Samples):
+            Samples[key] = np.sum(Samples[key]*Weights,axis=-1)/np.sum(Weights,axis=-1)
+
+    return Samples
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""
+Simulate3DTurb
+function: simulate the 3D wind fields of all unfrozen planes with the Kaimal or Mann model in python
+------------------------------------------------------------------------------------
+Usage
+TurbData3D, ConfigParameters = Simulate3DTurb(ConfigParameters)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters, output of the function #Execute3DSim.py#
+                  with ConfigParameters['Backend3D'] = 'native'
+---------------------------------------------------------------------------------
+Outputs
+TurbData3D: -dict, independent 3D turbulence data at differnt yz planes, one plane per seed
+            three fields __['U'], __['V'], and __['W'] storing the three wind components
+            each field is a 4D array with size of (Nz,Ny,Nt,Nplanes)
+ConfigParameters: -dict, configuration parameters, for Kaimal with the binary scale and 
+                  offset of the first plane as in a .wnd file of TurbSim (see #writeBLgrid.py#)
+If ConfigParameters['Save3D'] is True, the 3D wind fields are also saved in 
+ConfigParameters['saveDir_3D'] as .wnd/.sum (Kaimal) or .bin files (Mann) as they are 
+written by TurbSim or MTG.
+---------------------------------------------------------------------------------
+Kaimal: the 3D wind fields are simulated with the method of Veers as in TurbSim (IECKAI):
+  - Kaimal spectra of IEC 61400-1 Ed.3 (Annex B) with the standard deviations of the
+    IEC turbulence class ('A+', 'A', 'B', 'C' or the turbulence intensity in percent)
+    and the wind type ('NTM', 'xETM', 'xEWM1', 'xEWM50' with the turbine class x)
+  - IEC exponential coherence of the u component between the grid points,
+    the v and w components are not spatially correlated
+  - uniformly distributed random phases of each frequency and grid point, the random
+    numbers only depend on the seed of the plane
+  - power law wind profile over the grid with the exponent ConfigParameters['PLExp']
+    (default 0.2, 0.11 for EWM)
+The Cholesky factors of the coherence are calculated for blocks of frequencies and
+applied to the random phases of all planes in one batched matrix product. The grid is
+centred at the hub height HubHt with GridHeight Lz and GridWidth Ly as in TurbSim, which
+requires at least 2 grid points in y and z and the lowest grid point above the ground.
+The reference height Href of Uref is only used for the wind profile.
+
+Mann: the 3D wind fields are simulated with the spectral tensor of the uniform shear
+model as in the Mann turbulence generator, using the parameters of the MTG input file
+(alphaEps, MannLengthScale, gamma, Nt/Ny/Nz, dx/dy/dz, see #ReadMTGInput.py#):
+        # Mann, J. (1998). 
+        # Wind field simulation. 
+        # Probabilistic Engineering Mechanics, 13(4), 269–282. 
+        # https://doi.org/10.1016/S0266-8920(97)00036-2
+  - von Karman energy spectrum and sheared eddy lifetime (hypergeometric function)
+  - the tensor is sampled at the centre of each wave number cell, except for the cells
+    near the origin, where it varies strongly within the cell (e.g. Phi33 grows like 
+    1/k1^2 for k2 = k3 = 0). There the tensor is averaged over the cell and factorized
+    again (Mann 1998, Sec. 4), the cells on the k1 axis are integrated in polar 
+    coordinates around the axis with logarithmic radii
+  - complex Gaussian Fourier coefficients of the periodic box, the random numbers 
+    only depend on the seed of the plane
+  - 3D inverse FFT of each component and plane with all CPU cores (scipy.fft)
+  The tensor is calculated for blocks of the x wave numbers and applied to the random
+  numbers of all planes. The box is flipped in x and y as the .bin files of MTG in 
+  #Import3DTurb.py#. The Fourier coefficients of all planes are kept in memory,
+  about 48 bytes per grid point and plane.
+
+The fields are simulated in double precision and returned as float32 if
+ConfigParameters['Precision'] is 'single'.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import numpy as np
+import os
+from writeBLgrid import writeBLgrid, BLgridScale
+from StageTimer import Stage
+
+
+def Simulate3DTurb(ConfigParameters):
+
+    if ConfigParameters['TurbModel'] == 'Kaimal':
+        TurbData3D,ConfigParameters = SimulateKaimal(ConfigParameters)
+    elif ConfigParameters['TurbModel'] == 'Mann':
+        TurbData3D,ConfigParameters = SimulateMann(ConfigParameters)
+
+    # save the 3D wind fields as the generators do
+    if ConfigParameters.get('Save3D',False):
+        with Stage('Save3D'):
+            for i in range(ConfigParameters['Nplanes']):
+                Save3DTurb(ConfigParameters,TurbData3D,i)
+
+    return TurbData3D,ConfigParameters
+
+
+def Save3DTurb(ConfigParameters,TurbData3D,i):
+
+    Prefix = os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i])
+
+    if ConfigParameters['TurbModel'] == 'Kaimal':
+        CheckKaimalGrid(ConfigParameters)
+        # size of the .wnd data: (time, velocity component, iy, iz)
+        velocity = np.stack([np.transpose(TurbData3D[comp][:,:,:,i],(2,1,0)) for comp in ['U','V','W']],axis=1)
+        writeBLgrid(Prefix,velocity,ConfigParameters['Lz']/(ConfigParameters['Nz']-1),\
+                    ConfigParameters['Ly']/(ConfigParameters['Ny']-1),ConfigParameters['dt'],HubHeight(ConfigParameters))
+    else:
+        # float32 box with size of (Nx,Ny,Nz) in C order, flipped back in x and y
+        for comp in ['U','V','W']:
+            np.ascontiguousarray(np.transpose(TurbData3D[comp][:,:,:,i],(2,1,0))[::-1,::-1,:],dtype=np.float32).tofile(Prefix+'_'+comp.lower()+'.bin')
+
+
+def SimulateKaimal(ConfigParameters):
+
+    Nt      = int(ConfigParameters['Nt'])
+    Ny      = ConfigParameters['Ny']
+    Nz      = ConfigParameters['Nz']
+    Nplanes = ConfigParameters['Nplanes']
+    Uref    = ConfigParameters['Uref']
+    Href    = ConfigParameters['Href']
+    HubHt   = HubHeight(ConfigParameters)
+    dt      = ConfigParameters['dt']
+    Np      = Ny*Nz
+    dtype   = np.float32 if ConfigParameters.get('Precision','double') == 'single' else np.float64
+
+    if Nt % 2:
+        raise ValueError('The native 3D generator requires an even number of time steps.')
+    CheckKaimalGrid(ConfigParameters)
+
+    print('Simulating '+str(Nplanes)+' 3D wind fields with the native Kaimal generator...')
+
+    # standard deviations and length scales of IEC 61400-1 Ed.3
+    sigma_u,PLExp = IECTurbulence(ConfigParameters)
+    sigma  = np.array([sigma_u,0.8*sigma_u,0.5*sigma_u])
+    Lambda = 0.7*min(HubHt,60)
+    L_k    = np.array([8.1,2.7,0.66])*Lambda
+    Lc     = 8.1*Lambda
+
+    # one sided frequencies without the mean, the Nyquist frequency is not simulated
+    nf = Nt//2
+    df = 1/(Nt*dt)
+    f  = np.arange(1,nf)*df
+
+    # Kaimal spectra, size: (3,nf-1)
+    S = 4*sigma[:,np.newaxis]**2*L_k[:,np.newaxis]/Uref/(1+6*f*L_k[:,np.newaxis]/Uref)**(5/3)
+
+    # grid points ordered as (Nz,Ny), centred at the hub height
+    y = np.linspace(-ConfigParameters['Ly']/2,ConfigParameters['Ly']/2,Ny)
+    z = np.linspace(HubHt-ConfigParameters['Lz']/2,HubHt+ConfigParameters['Lz']/2,Nz)
+    Y,Z = np.meshgrid(y,z)
+    r = np.hypot(Y.reshape(-1,1)-Y.reshape(1,-1),Z.reshape(-1,1)-Z.reshape(1,-1))
+
+    # the variance of a cosine with amplitude A is A^2/2, so the amplitudes follow
+    # from 2*S*df, the factor Nt/2 is the normalisation of the inverse real FFT
+    Amp = np.sqrt(2*S*df)*Nt/2
+    MemoryBudget = ConfigParameters.get('MemoryBudget',None) or 1e9
+    nb = int(max(1,MemoryBudget//(4*8*Np**2)))
+
+    # mean wind profile of the u component
+    Profile = np.zeros((3,Nz))
+    Profile[0] = Uref*(z/Href)**PLExp
+
+    TurbData3D = {}
+    for c,comp in enumerate(['U','V','W']):
+
+        # random phases of all planes, size: (nf-1,Np,Nplanes), each plane only depends
+        # on its seed and the component
+        with Stage('RandomPhases'):
+            phase = np.empty((nf-1,Np,Nplanes))
+            for i,seed in enumerate(ConfigParameters['Seeds']):
+                phase[:,:,i] = np.random.default_rng([int(seed),c]).uniform(0,2*np.pi,(nf-1,Np))
+
+        # Fourier coefficients, size: (Np,nf+1,Nplanes), the mean and the Nyquist bin are zero
+        FC = np.zeros((Np,nf+1,Nplanes),dtype=np.complex128)
+        if c == 0:
+            # u component: Cholesky factors of the coherence for blocks of frequencies,
+            # size: (nb,Np,Np), applied to the phases of all planes at once
+            for k in range(0,nf-1,nb):
+                fb = f[k:k+nb]
+                with Stage('Cholesky'):
+                    Coh = np.exp(-12*np.sqrt((fb[:,np.newaxis,np.newaxis]*r/Uref)**2+(0.12*r/Lc)**2))
+                    H   = np.linalg.cholesky(Coh)*Amp[0,k:k+nb,np.newaxis,np.newaxis]
+                    del Coh
+                with Stage('Mixing'):
+                    FC[:,k+1:k+1+len(fb),:] = np.transpose(np.matmul(H,np.cos(phase[k:k+nb]))+1j*np.matmul(H,np.sin(phase[k:k+nb])),(1,0,2))
+                del H
+        else:
+            # v and w components: uncorrelated grid points
+            with Stage('Mixing'):
+                FC[:,1:nf,:] = np.transpose(Amp[c][:,np.newaxis,np.newaxis]*np.exp(1j*phase),(1,0,2))
+        del phase
+
+        # time series, size: (Nz,Ny,Nt,Nplanes)
+        with Stage('iFFT'):
+            data = np.reshape(np.fft.irfft(FC,n=Nt,axis=1),(Nz,Ny,Nt,Nplanes))
+        del FC
+        TurbData3D[comp] = np.asarray(data+Profile[c][:,np.newaxis,np.newaxis,np.newaxis],dtype=dtype)
+        del data
+
+    # binary scale and offset of the first plane as in the .wnd file of TurbSim
+    ConfigParameters['binary_Scale'],ConfigParameters['binary_Offset'] = \
+        BLgridScale(TurbData3D['U'][:,:,:,0],TurbData3D['V'][:,:,:,0],TurbData3D['W'][:,:,:,0])
+
+    return TurbData3D,ConfigParameters
+
+
+def CheckKaimalGrid(ConfigParameters):
+
+    # the grid spacing is Lz/(Nz-1) and Ly/(Ny-1), and the power law profile
+    # is only defined above the ground
+    if ConfigParameters['Ny'] < 2 or ConfigParameters['Nz'] < 2:
+        raise ValueError('The native Kaimal generator requires at least 2 grid points in y and z.')
+    if ConfigParameters['Lz']/2 >= HubHeight(ConfigParameters):
+        raise ValueError('The lowest grid point ('+str(HubHeight(ConfigParameters)-ConfigParameters['Lz']/2)+\
+                         ' m) must be above the ground. Please reduce the GridHeight or increase the hub height.')
+
+
+def HubHeight(ConfigParameters):
+
+    # the grid of TurbSim is centred at HubHt, Href is used if HubHt is not given
+    return ConfigParameters.get('HubHt',ConfigParameters['Href'])
+
+
+def IECTurbulence(ConfigParameters):
+
+    # standard deviation of the u component and power law exponent of the wind profile
+    # for the IEC turbulence class and wind type (IEC 61400-1 Ed.3, 6.3)
+    Uref      = ConfigParameters['Uref']
+    TurbClass = ConfigParameters['TurbClass']
+    WindType  = ConfigParameters['WindType'].upper()
+    Iref      = {'A+': 0.18,'A': 0.16,'B': 0.14,'C': 0.12}.get(TurbClass,None)
+    PLExp     = ConfigParameters.get('PLExp',None)
+
+    if Iref is None:
+        try:
+            TI = float(TurbClass)/100
+        except ValueError:
+            raise ValueError('Wrong turbulence class. Please define IEC turbulence Class as A+, A, B, C, or the turbulence intensity in percent.')
+        if WindType != 'NTM':
+            raise ValueError('The wind type '+WindType+' requires the IEC turbulence class A+, A, B, or C.')
+
+    if WindType == 'NTM':
+        sigma_u = Iref*(0.75*Uref+5.6) if Iref is not None else TI*Uref
+    elif WindType[1:] in {'ETM','EWM1','EWM50'} and WindType[0] in {'1','2','3'}:
+        Vref = {'1': 50,'2': 42.5,'3': 37.5}[WindType[0]]
+        if WindType[1:] == 'ETM':
+            c = 2
+            sigma_u = c*Iref*(0.072*(0.2*Vref/c+3)*(Uref/c-4)+10)
+        else:
+            sigma_u = 0.11*Uref
+            PLExp   = 0.11 if PLExp is None else PLExp
+    else:
+        raise ValueError('Wrong wind type '+WindType+'. The native 3D generator supports NTM, xETM, xEWM1, and xEWM50.')
+
+    return sigma_u,0.2 if PLExp is None else PLExp
+
+
+def SimulateMann(ConfigParameters):
+
+    from scipy import fft
+
+    Nx      = int(ConfigParameters['Nt'])
+    Ny      = ConfigParameters['Ny']
+    Nz      = ConfigParameters['Nz']
+    Nplanes = ConfigParameters['Nplanes']
+    L       = ConfigParameters['MannLengthScale']
+    Gamma   = ConfigParameters['gamma']
+    dtype   = np.float32 if ConfigParameters.get('Precision','double') == 'single' else np.float64
+
+    print('Simulating '+str(Nplanes)+' 3D wind fields with the native Mann generator...')
+
+    # wave numbers of the periodic box and the volume of one wave number cell
+    k1 = 2*np.pi*np.fft.fftfreq(Nx,ConfigParameters['dx'])
+    k2 = 2*np.pi*np.fft.fftfreq(Ny,ConfigParameters['dy'])
+    k3 = 2*np.pi*np.fft.fftfreq(Nz,ConfigParameters['dz'])
+    dk = 2*np.pi/np.array([Nx*ConfigParameters['dx'],Ny*ConfigParameters['dy'],Nz*ConfigParameters['dz']])
+    dK = np.prod(dk)
+
+    # cell averages of the tensor near the origin
+    with Stage('SpectralTensor'):
+        CellIndex,CellA = CellTensor(k1,k2,k3,dk,L,Gamma,ConfigParameters['alphaEps'])
+
+    # Fourier coefficients of all components and planes, size: (3,Nplanes,Nx,Ny,Nz)
+    FC  = np.empty((3,Nplanes,Nx,Ny,Nz),dtype=np.complex128)
+    rng = [np.random.default_rng(int(seed)) for seed in ConfigParameters['Seeds']]
+
+    # blocks of x wave numbers, about 30 arrays of the size of the block in the tensor
+    MemoryBudget = ConfigParameters.get('MemoryBudget',None) or 1e9
+    nb = int(max(1,MemoryBudget//(30*8*Ny*Nz)))
+    for ib in range(0,Nx,nb):
+
+        with Stage('SpectralTensor'):
+            K1,K2,K3 = np.meshgrid(k1[ib:ib+nb],k2,k3,indexing='ij')
+            A = MannTensor(K1,K2,K3,L,Gamma,ConfigParameters['alphaEps'])
+            InBlock = (CellIndex[0] >= ib) & (CellIndex[0] < ib+nb)
+            A[:,:,CellIndex[0][InBlock]-ib,CellIndex[1][InBlock],CellIndex[2][InBlock]] = CellA[:,:,InBlock]
+            A *= np.sqrt(dK)
+
+        # complex Gaussian random numbers with E|n|^2 = 2, the real part of the
+        # inverse FFT then has the variance of the tensor. The random numbers of a
+        # block follow each other in the stream of the plane's generator.
+        with Stage('Mixing'):
+            for i in range(Nplanes):
+                n = rng[i].standard_normal(np.shape(K1)+(3,2))
+                n = n[...,0]+1j*n[...,1]
+                for c in range(3):
+                    FC[c,i,ib:ib+nb] = np.sum(A[c]*np.moveaxis(n,3,0),axis=0)
+                del n
+        del A,K1,K2,K3
+
+    # 3D inverse FFT of each component and plane, the box is flipped in x and y
+    # as the .bin files of MTG in #Import3DTurb.py#, size: (Nz,Ny,Nt,Nplanes)
+    TurbData3D = {}
+    for c,comp in enumerate(['U','V','W']):
+        TurbData3D[comp] = np.empty((Nz,Ny,Nx,Nplanes),dtype=dtype)
+        for i in range(Nplanes):
+            with Stage('iFFT'):
+                box = fft.ifftn(FC[c,i],overwrite_x=True,workers=-1).real*(Nx*Ny*Nz)
+            TurbData3D[comp][:,:,:,i] = np.transpose(box[::-1,::-1,:],(2,1,0))
+            del box
+    del FC
+
+    return TurbData3D,ConfigParameters
+
+
+def CellTensor(k1,k2,k3,dk,L,Gamma,alphaEps,nSub=4,nPolar=(2,16,24),rMin=1e-4):
+
+    # cells within 3 half diagonals of the origin, the mean flow (k = 0) is not included
+    h     = 0.5*np.sqrt(np.sum(dk**2))
+    Index = [np.ravel(i) for i in np.meshgrid(*[np.flatnonzero(np.abs(k) <= 3*h) for k in (k1,k2,k3)],indexing='ij')]
+    K     = [k1[Index[0]],k2[Index[1]],k3[Index[2]]]
+    kk    = K[0]**2+K[1]**2+K[2]**2
+    Low   = (kk > 0) & (kk <= (3*h)**2)
+    Index = [i[Low] for i in Index]
+    K     = [k[Low] for k in K]
+    Axis  = (K[1] == 0) & (K[2] == 0)
+    Phi   = np.zeros((3,3,len(K[0])))
+
+    # midpoint rule with nSub points along the largest side of the cell, Phi = A A^T
+    Sub = [(np.arange(n)+0.5)/n-0.5 for n in [max(1,int(round(nSub*d/np.max(dk)))) for d in dk]]
+    for o1 in Sub[0]:
+        for o2 in Sub[1]:
+            for o3 in Sub[2]:
+                A = MannTensor(K[0][~Axis]+o1*dk[0],K[1][~Axis]+o2*dk[1],K[2][~Axis]+o3*dk[2],L,Gamma,alphaEps)
+                Phi[:,:,~Axis] += np.einsum('ikn,jkn->ijn',A,A)/(len(Sub[0])*len(Sub[1])*len(Sub[2]))
+
+    # the tensor of the cells on the k1 axis is concentrated around the axis: Gauss points
+    # along k1 and polar coordinates in the rectangle of (k2,k3) with logarithmic radii
+    # from rMin times the distance to the edge, dk2 dk3 = r^2 dln(r) dtheta
+    x1,w1 = np.polynomial.legendre.leggauss(nPolar[0])
+    theta = (np.arange(nPolar[1])+0.5)*2*np.pi/nPolar[1]
+    ds    = -np.log(rMin)/nPolar[2]
+    s     = np.log(rMin)+(np.arange(nPolar[2])+0.5)*ds
+    for x,w in zip(x1,w1):
+        for t in theta:
+            with np.errstate(divide='ignore'):
+                r = min(dk[1]/2/abs(np.cos(t)),dk[2]/2/abs(np.sin(t)))*np.exp(s)
+            K1,R = np.meshgrid(K[0][Axis]+x*dk[0]/2,r,indexing='ij')
+            A = MannTensor(K1,R*np.cos(t),R*np.sin(t),L,Gamma,alphaEps)
+            Phi[:,:,Axis] += w/2*np.einsum('ikns,jkns,s->ijn',A,A,r**2)*ds*2*np.pi/nPolar[1]/(dk[1]*dk[2])
+
+    # factorize the cell averages again, Phi = A A^T with the eigenvalues of Phi
+    Lambda,V = np.linalg.eigh(np.moveaxis(Phi,2,0))
+    A = V*np.sqrt(np.maximum(Lambda,0))[:,np.newaxis,:]
+
+    return Index,np.moveaxis(A,0,2)
+
+
+def MannTensor(k1,k2,k3,L,Gamma,alphaEps):
+
+    # matrix A with size of (3,3,...) of the uniform shear model, Phi = A A^H (Mann 1998, Eq. 46)
+    from scipy.special import hyp2f1
+
+    kk = k1**2+k2**2+k3**2
+    k  = np.sqrt(kk)
+    with np.errstate(divide='ignore',invalid='ignore'):
+
+        # sheared eddy lifetime
+        beta = Gamma*(k*L)**(-2/3)/np.sqrt(hyp2f1(1/3,17/6,4/3,-(k*L)**(-2)))
+
+        # wave vector before the shear
+        k30  = k3+beta*k1
+        kk0  = k1**2+k2**2+k30**2
+        k0   = np.sqrt(kk0)
+
+        # von Karman energy spectrum of the initial wave vector
+        E0   = 1.453*alphaEps*L**(5/3)*(L*k0)**4/(1+(L*k0)**2)**(17/6)
+
+        kk12 = k1**2+k2**2
+        C1   = beta*k1**2*(kk0-2*k30**2+beta*k1*k30)/(kk*kk12)
+        C2   = k2*kk0/kk12**1.5*np.arctan(beta*k1*np.sqrt(kk12)/(kk0-k30*k1*beta))
+        zeta1 = C1-k2/k1*C2
+        zeta2 = k2/k1*C1+C2
+        # no shear distortion without a component along x
+        zeta1[k1 == 0] = 0
+        zeta2[k1 == 0] = 0
+
+        s  = np.sqrt(E0/(4*np.pi*kk0**2))
+        # the isotropic tensor of the initial wave vector, distorted by the shear
+        A = np.empty((3,3)+np.shape(k),dtype=np.float64)
+        A[0,0] = zeta1*k2
+        A[0,1] = k30-zeta1*k1
+        A[0,2] = -k2
+        A[1,0] = zeta2*k2-k30
+        A[1,1] = -zeta2*k1
+        A[1,2] = k1
+        A[2,0] = kk0/kk*k2
+        A[2,1] = -kk0/kk*k1
+        A[2,2] = 0
+        A *= s
+
+    # the mean flow is not part of the turbulence
+    A[:,:,k == 0] = 0
+
+    return A
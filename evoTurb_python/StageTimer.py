@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+StageTimer
+function: record the wall time, CPU time, and peak memory of the stages of a 4D wind field generation
+------------------------------------------------------------------------------------
+Usage
+StartTiming(ConfigParameters)
+with Stage(Name) as stage:
+    ...
+    stage.AddChildCPU(CPU)
+Report = StopTiming(ConfigParameters)
+-----------------------------------------------------------------------------------
+Inputs
+ConfigParameters: -dict, configuration parameters, timing is only active if
+                  ConfigParameters['Timing'] is True or ConfigParameters['ProfilerHook'] is set
+CPU: -float, CPU time of a subprocess run in a stage of a worker thread [s]
+Name: -string, name of the stage or sub-step, e.g. 'Generate4DTurb' or 'FFT'. Stages opened
+      inside another stage are recorded as 'Outer/Inner', a name starting with '/' is absolute
+      (for sub-steps run in worker threads)
+---------------------------------------------------------------------------------
+Outputs
+Report: -dict, also saved as ConfigParameters['saveDir_4D']/<SimulationName4D>_timing.json
+        __['Stages']: one entry per stage name in the order of the first call with the fields
+        'Count' (number of calls), 'Wall' and 'CPU' (summed over the calls [s]),
+        'ChildCPU' (CPU time of finished subprocesses, e.g. TurbSim or MTG [s]) and
+        'PeakRSS' (peak resident memory of the process during the stage [bytes])
+        __['Total']: the same fields for the whole run
+---------------------------------------------------------------------------------
+The CPU time of the stages in the main thread is the time of all threads of the process
+and the child CPU time the time of all finished subprocesses. The stages in worker threads
+run at the same time as other workers, so their CPU time is the time of their own thread
+and their child CPU time the sum of the CPU times given with stage.AddChildCPU (e.g. from
+the resource usage of each TurbSim or MTG run, see #Execute3DSim.py#). The peak memory of a stage is
+measured by resetting the high-water mark of the process at the start of the stage
+(Linux, /proc/self/clear_refs). Where this is not possible, the peak memory since the
+start of the process is reported, or None if it is not available (Windows without psutil).
+ConfigParameters['ProfilerHook'] connects an external profiler:
+   - a function hook(Name,Event) called with Event 'start' and 'stop' of each stage
+   - a string 'module.function' of such a function, e.g. from a json configuration
+   - 'cProfile', the whole run is profiled and the statistics are saved as
+     <SimulationName4D>_timing.prof next to the report
+If timing is not active, Stage does nothing.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import importlib
+import json
+import os
+import platform
+import threading
+import time
+try:
+    import resource
+except ImportError:
+    resource = None   # Windows
+
+# the report of the running generation, None if timing is not active
+Report = None
+ReportLock = threading.Lock()
+Local = threading.local()
+
+
+def StartTiming(ConfigParameters):
+
+    global Report
+
+    # a report of a run that was not stopped is discarded
+    if Report is not None and Report['Profiler'] is not None:
+        Report['Profiler'].disable()
+    Report = None
+
+    Hook = ConfigParameters.get('ProfilerHook',None)
+    if not ConfigParameters.get('Timing',False) and not Hook:
+        Report = None
+        return
+
+    Profiler = None
+    if Hook == 'cProfile':
+        import cProfile
+        Profiler = cProfile.Profile()
+        Hook = None
+    elif isinstance(Hook,str):
+        module,function = Hook.rsplit('.',1)
+        Hook = getattr(importlib.import_module(module),function)
+
+    Local.stack = []
+    Report = {'Stages': {},'Hook': Hook,'Profiler': Profiler,'Main': threading.get_ident(),
+              'Start': time.time(),'Wall': time.perf_counter(),'CPU': time.process_time(),
+              'ChildCPU': ChildCPU(),'Peak': PeakRSS()}
+    if Profiler is not None:
+        Profiler.enable()
+
+
+def StopTiming(ConfigParameters):
+
+    global Report
+
+    if Report is None:
+        return None
+
+    Current,Report = Report,None
+    if Current['Profiler'] is not None:
+        Current['Profiler'].disable()
+    Total = {'Wall': time.perf_counter()-Current['Wall'],'CPU': time.process_time()-Current['CPU'],
+             'ChildCPU': ChildCPU()-Current['ChildCPU'],'PeakRSS': MaxPeak(Current['Peak'],PeakRSS())}
+
+    Out = {'Name': ConfigParameters.get('SimulationName4D',None),
+           'Start': time.strftime('%Y-%m-%dT%H:%M:%S',time.localtime(Current['Start'])),
+           'Host': platform.node(),
+           'Config': {k: ConfigParameters[k] for k in ['TurbModel','EvoModel','Ny','Nz','Nt','Nplanes','Precision','MemoryBudget'] \
+                      if k in ConfigParameters},
+           'Total': Total,
+           'Stages': [dict(Name=Name,**Entry) for Name,Entry in Current['Stages'].items()]}
+
+    FileName = os.path.join(ConfigParameters['saveDir_4D'],str(Out['Name'])+'_timing')
+    with open(FileName+'.json','w') as f2write:
+        json.dump(Out,f2write,indent=1,default=str)
+    if Current['Profiler'] is not None:
+        Current['Profiler'].dump_stats(FileName+'.prof')
+    ConfigParameters['TimingReport'] = FileName+'.json'
+
+    print('Timing report saved: '+os.path.basename(FileName)+'.json')
+    return Out
+
+
+class Stage:
+
+    def __init__(self,Name):
+
+        self.Name = Name
+        self.Active = False
+
+    def __enter__(self):
+
+        Current = Report
+        if Current is None:
+            return self
+
+        self.Active = True
+        self.Current = Current
+        # stages of worker threads only measure their own thread and subprocesses
+        self.Worker = threading.get_ident() != Current['Main']
+        stack = getattr(Local,'stack',None)
+        if stack is None:
+            stack = Local.stack = []
+        if self.Name.startswith('/'):
+            self.Path = self.Name[1:]
+        else:
+            self.Path = '/'.join([s.Path for s in stack[-1:]]+[self.Name])
+        # the high-water mark is only reset in the main thread, worker threads
+        # share the memory of the process
+        self.Reset = not self.Worker
+        if self.Reset:
+            # the peak of the run and of the enclosing stages up to now
+            Peak = PeakRSS()
+            Current['Peak'] = MaxPeak(Current['Peak'],Peak)
+            for s in stack:
+                s.Peak = MaxPeak(s.Peak,Peak)
+            ResetPeakRSS()
+        stack.append(self)
+        self.Peak = None
+
+        if Current['Hook'] is not None:
+            Current['Hook'](self.Path,'start')
+        self.Wall = time.perf_counter()
+        self.CPU = time.thread_time() if self.Worker else time.process_time()
+        self.ChildCPU = 0.0 if self.Worker else ChildCPU()
+        return self
+
+    def __exit__(self,*args):
+
+        if self.Active:
+            self.Stop()
+
+    def Stop(self):
+
+        self.Wall = time.perf_counter()-self.Wall
+        if self.Worker:
+            self.CPU = time.thread_time()-self.CPU
+        else:
+            self.CPU = time.process_time()-self.CPU
+            self.ChildCPU = ChildCPU()-self.ChildCPU
+        self.Peak = MaxPeak(self.Peak,PeakRSS())
+        self.Active = False
+
+        stack = Local.stack
+        stack.remove(self)
+        if self.Reset:
+            # the run and the enclosing stages include the peak of this stage
+            self.Current['Peak'] = MaxPeak(self.Current['Peak'],self.Peak)
+            for s in stack:
+                s.Peak = MaxPeak(s.Peak,self.Peak)
+        if self.Current['Hook'] is not None:
+            self.Current['Hook'](self.Path,'stop')
+
+        # calls with the same name are summed up
+        with ReportLock:
+            Entry = self.Current['Stages'].setdefault(self.Path,{'Count': 0,'Wall': 0.0,'CPU': 0.0,'ChildCPU': 0.0,'PeakRSS': None})
+            Entry['Count'] += 1
+            Entry['Wall'] += self.Wall
+            Entry['CPU'] += self.CPU
+            Entry['ChildCPU'] += self.ChildCPU
+            Entry['PeakRSS'] = MaxPeak(Entry['PeakRSS'],self.Peak)
+
+
+    def AddChildCPU(self,CPU):
+
+        # CPU time of a subprocess of this worker thread, included in the
+        # process-wide child CPU time of the stages in the main thread
+        if self.Active and self.Worker and CPU is not None:
+            self.ChildCPU += CPU
+
+
+def MaxPeak(a,b):
+
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a,b)
+
+
+def PeakRSS():
+
+    # peak resident memory [bytes], since the last reset on Linux
+    try:
+        with open('/proc/self/status') as f2read:
+            for line in f2read:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    if resource is not None:
+        # kilobytes on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*(1 if platform.system() == 'Darwin' else 1024)
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError,AttributeError):
+        return None
+
+
+def ResetPeakRSS():
+
+    # only possible on Linux, elsewhere the peak since the start of the process is kept
+    try:
+        with open('/proc/self/clear_refs','w') as f2write:
+            f2write.write('5')
+    except OSError:
+        pass
+
+
+def ChildCPU():
+
+    # user and system time of the finished subprocesses
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime+usage.ru_stime
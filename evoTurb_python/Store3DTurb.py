@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Store3DTurb
+function: content-addressed store of the 3D wind fields generated with TurbSim or MTG
+------------------------------------------------------------------------------------
+Usage
+key = Store3DKey(Generator,exeDir,Input,Seed)
+Prefix = LookupStore3D(StoreDir,key,Name,Extensions,Verify)
+WriteManifest(StoreDir,key,Name,Extensions)
+EvictStore3D(StoreDir,StoreSize,keep)
+Prefix = PlanePath(ConfigParameters,i)
+-----------------------------------------------------------------------------------
+Inputs
+Generator: -string, 'TurbSim' or 'MTG'
+exeDir: -string, the directory of the .exe file of the generator
+Input: -string, the generator input without output paths (input file or MTG arguments)
+Seed: -int, random seed of the 3D wind field
+StoreDir: -string, directory of the store, ConfigParameters['Store3D']
+key: -string, key of the store entry
+Name: -string, name of the 3D wind field, e.g. ConfigParameters['SimulationName3D'][i]
+Extensions: -list, file name endings of the outputs, e.g. ['.sum','.wnd'] or ['_u.bin','_v.bin','_w.bin']
+Verify: -bool, check the sha256 checksums in addition to the file sizes
+StoreSize: -float, maximum size of the store [bytes]
+keep: -set, keys of the entries which must not be deleted
+---------------------------------------------------------------------------------
+Outputs
+key: -string, sha256 of the generator, the identity of the .exe file, the input, and the seed
+Prefix: -string, path of the 3D wind field without the file name ending,
+        None if the entry does not exist or is incomplete
+---------------------------------------------------------------------------------
+Each entry is a folder StoreDir/key with the outputs of one 3D simulation and a
+manifest.json recording the size and sha256 of each file and the time of the last use.
+The manifest is written last, an entry without a valid manifest is incomplete.
+The least recently used entries are deleted if the store exceeds StoreSize bytes.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# identity of the .exe files, (path, size, modification time) -> sha256
+exeHashes = {}
+
+
+def Store3DKey(Generator,exeDir,Input,Seed):
+
+    key = hashlib.sha256(json.dumps({'Generator': Generator,
+                                     'exe': exeIdentity(exeDir),
+                                     'Input': Input,
+                                     'Seed': int(Seed)},sort_keys=True).encode())
+
+    return key.hexdigest()
+
+
+def exeIdentity(exeDir):
+
+    # the content of the .exe file identifies the generator version independent of
+    # its location, the hash is only recalculated if the file is changed
+    try:
+        stat = os.stat(exeDir)
+    except OSError:
+        return 'missing:'+os.path.basename(exeDir)
+    ident = (os.path.abspath(exeDir),stat.st_size,stat.st_mtime_ns)
+    if ident not in exeHashes:
+        exeHashes[ident] = FileHash(exeDir)
+
+    return exeHashes[ident]
+
+
+def FileHash(FileName):
+
+    h = hashlib.sha256()
+    with open(FileName,'rb') as fid:
+        for block in iter(lambda: fid.read(1 << 24),b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def LookupStore3D(StoreDir,key,Name,Extensions,Verify=False):
+
+    EntryDir     = os.path.join(StoreDir,key)
+    ManifestFile = os.path.join(EntryDir,'manifest.json')
+
+    try:
+        with open(ManifestFile) as f2read:
+            Manifest = json.load(f2read)
+    except (OSError,ValueError):
+        return None
+
+    # check that all outputs are complete
+    Prefix = os.path.join(EntryDir,Manifest['Name'])
+    for ext in Extensions:
+        FileName = Prefix+ext
+        if ext not in Manifest['Files'] or not os.path.isfile(FileName) or \
+           os.path.getsize(FileName) != Manifest['Files'][ext]['Size'] or \
+           (Verify and FileHash(FileName) != Manifest['Files'][ext]['sha256']):
+            print('Incomplete 3D wind field in the store: '+Name+' ('+key+')')
+            return None
+
+    # mark the entry as recently used
+    Manifest['LastUsed'] = time.time()
+    WriteJson(ManifestFile,Manifest)
+
+    return Prefix
+
+
+def WriteManifest(StoreDir,key,Name,Extensions):
+
+    EntryDir = os.path.join(StoreDir,key)
+    Files    = {}
+    for ext in Extensions:
+        FileName = os.path.join(EntryDir,Name+ext)
+        Files[ext] = {'Size': os.path.getsize(FileName),'sha256': FileHash(FileName)}
+
+    WriteJson(os.path.join(EntryDir,'manifest.json'),{'Name': Name,'Files': Files,'LastUsed': time.time()})
+
+
+def WriteJson(FileName,data):
+
+    # replace the file atomically, other runs may read it at the same time
+    tmpName = FileName+'.'+str(os.getpid())+'.tmp'
+    with open(tmpName,'w') as f2write:
+        json.dump(data,f2write,indent=1)
+    os.replace(tmpName,FileName)
+
+
+def EvictStore3D(StoreDir,StoreSize,keep):
+
+    # complete entries sorted by the last use, oldest first
+    entries = []
+    for key in os.listdir(StoreDir):
+        EntryDir = os.path.join(StoreDir,key)
+        if key in keep or not os.path.isdir(EntryDir):
+            continue
+        try:
+            with open(os.path.join(EntryDir,'manifest.json')) as f2read:
+                Manifest = json.load(f2read)
+            LastUsed = Manifest['LastUsed']
+        except (OSError,ValueError,KeyError):
+            # incomplete entries are only deleted if they are not written right now
+            try:
+                if time.time()-os.path.getmtime(EntryDir) > 24*3600:
+                    shutil.rmtree(EntryDir,ignore_errors=True)
+            except OSError:
+                pass
+            continue
+        entries.append((LastUsed,EntrySize(EntryDir),EntryDir))
+    entries.sort()
+
+    TotalSize = sum([entry[1] for entry in entries])+sum([EntrySize(os.path.join(StoreDir,key)) for key in keep])
+
+    for _,size,EntryDir in entries:
+        if TotalSize <= StoreSize:
+            break
+        shutil.rmtree(EntryDir,ignore_errors=True)
+        TotalSize -= size
+
+
+def EntrySize(EntryDir):
+
+    size = 0
+    try:
+        for f in os.listdir(EntryDir):
+            size += os.path.getsize(os.path.join(EntryDir,f))
+    except OSError:
+        pass   # removed by another run
+
+    return size
+
+
+def PlanePath(ConfigParameters,i):
+
+    # path of the i-th 3D wind field without the file name ending, set by #Execute3DSim.py#
+    if 'Path3D' in ConfigParameters:
+        return ConfigParameters['Path3D'][i]
+
+    return os.path.join(ConfigParameters['saveDir_3D'],ConfigParameters['SimulationName3D'][i])
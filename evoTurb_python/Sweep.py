@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Sweep
+function: generate the 4D wind fields of a parameter sweep, e.g. a set of design load cases
+------------------------------------------------------------------------------------
+Usage
+State = Sweep(Grid,SweepDir,BaseConfig,NumWorkers)
+python Sweep.py SweepFile.json
+-----------------------------------------------------------------------------------
+Inputs
+Grid: -dict, values of the swept configurations, all combinations are generated, e.g.
+      {'Uref': [8,12,16], 'TurbClass': ['A','B'], 'Seeds': [[1,2,3],[4,5,6]], 'EvoModel': ['Exp-Simley','Kristensen']}
+      or -list of dicts, one dict per case
+SweepDir: -string, directory of the sweep, the 4D wind fields of each case are saved
+          in SweepDir/<case name>, 3D wind fields in SweepDir/3DTurb_* if BaseConfig has no 'saveDir'
+BaseConfig: -dict, optional, configurations common to all cases, see #TurbConfig.py#
+NumWorkers: -int, optional, number of worker processes, None = number of CPU cores
+SweepFile.json: a json file with the fields "Grid", "SweepDir", "BaseConfig", and "NumWorkers"
+---------------------------------------------------------------------------------
+Outputs
+State: -dict, the state of the sweep, also saved in SweepDir/SweepState.json
+       __['Cases'][<case name>] with the fields 'Config', 'Seeds', 'Status', and 'Outputs'
+---------------------------------------------------------------------------------
+The sweep is run as a job graph on a process pool:
+   3D simulation (TurbSim or MTG)  \
+                                    -> import, unfreezing, and export of one case
+   Cholesky factors of Cohx        /
+Each 3D wind field and each set of Cholesky factors shared by several cases is only
+generated once. The state is saved after each finished case, a sweep that is run again
+skips the finished cases and the existing 3D wind fields and cached Cholesky factors.
+With ConfigParameters['Backend3D'] = 'native', there are no 3D jobs: each case simulates 
+its 3D wind fields and hands them to the unfreezing in memory (see #Run3DTurb.py#), 
+they are only written if ConfigParameters['Save3D'] is True.
+If the 3D wind fields are saved in a store (ConfigParameters['Store3D'], see #Store3DTurb.py#),
+its quota Store3DSize is applied once after the jobs have finished, the 3D wind fields of
+all planned cases are kept.
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from TurbConfig import TurbConfig
+from Execute3DSim import PlanSimJobs, RunSimJob
+from Store3DTurb import EvictStore3D
+from CalcHx import CalcHx, CohxCacheKey
+from Run3DTurb import Run3DTurb
+from Generate4DTurb import Generate4DTurb, RemoveScratch4D
+from Export4DTurb import Export4DTurb
+from StageTimer import StartTiming, StopTiming, Stage
+
+
+def Sweep(Grid,SweepDir,BaseConfig=None,NumWorkers=None):
+
+    os.makedirs(SweepDir,exist_ok=True)
+    StateFile = os.path.join(SweepDir,'SweepState.json')
+    State     = {'Cases': {}}
+    if os.path.isfile(StateFile):
+        with open(StateFile) as f2read:
+            State = json.load(f2read)
+
+    # plan the jobs of all unfinished cases
+    Jobs3D   = {}   # final paths of the 3D wind field -> (ConfigParameters,SimJob)
+    JobsCohx = {}   # cache key -> ConfigParameters
+    Pending  = {}   # case name -> (ConfigParameters,dependencies)
+    Stores3D = {}   # store of 3D wind fields -> (quota,keys of the planned cases)
+    for UserConfig in SweepCases(Grid,BaseConfig,SweepDir):
+
+        CaseName = SweepCaseName(UserConfig)
+        Case     = State['Cases'].setdefault(CaseName,{'Config': UserConfig,'Status': 'pending'})
+        if Case['Status'] == 'done' and all([os.path.isfile(f) for f in Case['Outputs']]):
+            continue
+        # random seeds are kept when the sweep is resumed
+        if 'Seeds' in Case:
+            UserConfig = dict(UserConfig,Seeds=Case['Seeds'])
+
+        ConfigParameters = TurbConfig(UserConfig)
+        ConfigParameters['saveDir_4D'] = os.path.join(SweepDir,CaseName)
+        ConfigParameters['CohxCache']  = True
+        os.makedirs(ConfigParameters['saveDir_Cache'],exist_ok=True)
+        os.makedirs(ConfigParameters['saveDir_4D'],exist_ok=True)
+        ConfigParameters,SimJobs = PlanSimJobs(ConfigParameters)
+        Case['Seeds']  = [int(seed) for seed in ConfigParameters['Seeds']]
+        if ConfigParameters.get('Store3D',None):
+            Store = Stores3D.setdefault(ConfigParameters['Store3D'],(ConfigParameters.get('Store3DSize',50e9),set()))
+            Store[1].update([key for key in ConfigParameters['StoreKeys3D'] if key])
+        Case['Status'] = 'pending'
+
+        Dependencies = []
+        for SimJob in SimJobs:
+            key = tuple([final for _,final in SimJob['Outputs']])
+            Jobs3D.setdefault(key,(ConfigParameters,SimJob))
+            Dependencies.append(('3D',key))
+        key = CohxCacheKey(ConfigParameters)
+        if not os.path.isfile(os.path.join(ConfigParameters['saveDir_Cache'],key+'.npy')):
+            JobsCohx.setdefault(key,ConfigParameters)
+            Dependencies.append(('Cohx',key))
+        Pending[CaseName] = (ConfigParameters,Dependencies)
+
+    WriteState(StateFile,State)
+    print('Sweep: '+str(len(Pending))+' of '+str(len(State['Cases']))+' cases to run, '+\
+          str(len(Jobs3D))+' 3D simulations, '+str(len(JobsCohx))+' sets of Cholesky factors')
+
+    NumWorkers = NumWorkers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=NumWorkers) as pool:
+
+        futures = {}
+        for key,(ConfigParameters,SimJob) in Jobs3D.items():
+            futures[pool.submit(RunSimJob,ConfigParameters,SimJob)] = ('3D',key)
+        for key,ConfigParameters in JobsCohx.items():
+            futures[pool.submit(SweepCohx,ConfigParameters)] = ('Cohx',key)
+
+        Finished = {}   # job -> success
+        while True:
+
+            # submit the cases whose 3D wind fields and Cholesky factors are ready
+            for CaseName,(ConfigParameters,Dependencies) in list(Pending.items()):
+                if all([job in Finished for job in Dependencies]):
+                    del Pending[CaseName]
+                    if all([Finished[job] for job in Dependencies]):
+                        futures[pool.submit(SweepCase,ConfigParameters)] = ('Case',CaseName)
+                    else:
+                        State['Cases'][CaseName]['Status'] = 'failed'
+                        State['Cases'][CaseName]['Error']  = '3D simulation or Cholesky factors failed'
+                        WriteState(StateFile,State)
+
+            if not futures:
+                break
+
+            done,_ = wait(futures,return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as err:
+                    result = False
+                    print('Sweep job failed: '+job[0]+' '+str(job[1])+': '+repr(err))
+                    if job[0] == 'Case':
+                        State['Cases'][job[1]]['Error'] = repr(err)
+                if job[0] == 'Case':
+                    State['Cases'][job[1]]['Status']  = 'done' if result else 'failed'
+                    State['Cases'][job[1]]['Outputs'] = result or []
+                    WriteState(StateFile,State)
+                else:
+                    Finished[job] = bool(result)
+
+    # keep the stores within their quota, the entries of the planned cases are not deleted
+    for Store,(StoreSize,keep) in Stores3D.items():
+        EvictStore3D(Store,StoreSize,keep)
+
+    failed = [CaseName for CaseName,Case in State['Cases'].items() if Case['Status'] != 'done']
+    if failed:
+        raise RuntimeError('Sweep cases failed: '+', '.join(failed)+'. Please check '+StateFile)
+
+    print('Sweep finished!')
+    return State
+
+
+def SweepCases(Grid,BaseConfig,SweepDir):
+
+    # all combinations of the swept values, or the given list of cases
+    if isinstance(Grid,dict):
+        keys  = sorted(Grid)
+        Cases = [dict(zip(keys,values)) for values in itertools.product(*[Grid[k] for k in keys])]
+    else:
+        Cases = list(Grid)
+
+    Base = dict(BaseConfig or {})
+    Base.setdefault('saveDir',SweepDir)
+
+    return [dict(Base,**Case) for Case in Cases]
+
+
+def SweepCaseName(UserConfig):
+
+    # the name only depends on the configuration, not on the order of the cases
+    key = hashlib.sha256(json.dumps(UserConfig,sort_keys=True,default=str).encode()).hexdigest()
+
+    return 'Case_'+key[:12]
+
+
+def SweepCohx(ConfigParameters):
+
+    # the Cholesky factors are written to the cache, see #CalcHx.py#
+    CalcHx(ConfigParameters)
+
+    return True
+
+
+def SweepCase(ConfigParameters):
+
+    # the timing report of each case is saved in its folder, the 3D simulations
+    # and Cholesky factors of the sweep are shared and not included. The timing is
+    # stopped if the case fails, the worker process runs further cases
+    StartTiming(ConfigParameters)
+    try:
+        TurbData3D, ConfigParameters = Run3DTurb(ConfigParameters,Planned=True)
+        with Stage('Generate4DTurb'):
+            TurbData4D, ConfigParameters = Generate4DTurb(ConfigParameters,TurbData3D)
+        with Stage('Export4DTurb'):
+            Export4DTurb(ConfigParameters,TurbData4D)
+        del TurbData4D
+        RemoveScratch4D(ConfigParameters)
+    finally:
+        StopTiming(ConfigParameters)
+
+    return [os.path.join(ConfigParameters['saveDir_4D'],ConfigParameters['SimulationName4D']+'_upstream.evo')]
+
+
+def WriteState(StateFile,State):
+
+    # replace the file atomically, the sweep may be interrupted at any time
+    with open(StateFile+'.tmp','w') as f2write:
+        json.dump(State,f2write,indent=1,default=str)
+    os.replace(StateFile+'.tmp',StateFile)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        print('Usage: python Sweep.py SweepFile.json')
+        sys.exit(1)
+    with open(sys.argv[1]) as f2read:
+        SweepFile = json.load(f2read)
+    Sweep(SweepFile['Grid'],SweepFile['SweepDir'],SweepFile.get('BaseConfig',None),SweepFile.get('NumWorkers',None))
@@ -5,10 +5,14 @@ function: 4D wind field configurations
 ----------------------------------------------------------------------------
 Usage
 ConfigParameters = TurbConfig()
+ConfigParameters = TurbConfig(UserConfig)
 Please modify the user-defined configurations in TurbConfig.
 ------------------------------------------------------------------------------
 Inputs
-No input variables required 
+UserConfig: -dict, optional, replaces the user-defined configurations below, e.g. 
+            {'Uref': 12, 'Seeds': [1,2,3], 'EvoModel': 'Kristensen'} in a parameter sweep.
+            For Kaimal, the values of 'Uref', 'TurbClass' and 'WindType' replace the ones
+            in the input file of TurbSim and are written in the input files of the 3D simulations
 -----------------------------------------------------------------------------
 Outputs
 ConfigParameters: -dict, configuration parameters 
@@ -29,7 +33,7 @@ from ReadTurbSimInput import ReadTurbSimInput
 from ReadMTGInput import ReadMTGInput
 
 #-----------------------------------------------
-def TurbConfig():
+def TurbConfig(UserConfig=None):
         
     ConfigParameters                    = {}
         
@@ -84,10 +88,26 @@ def TurbConfig():
             https://doi.org/10.1007/BF02350508
        This model is based on physical deduction.
     -------------------------------------------------------------------------------------------------------------    
+    3.'Exp-GPR' uses the wind evolution model (Eq.6) and 
+       the GPR models case 15 for a and case 17 for b (Table5) in
+            Chen, Y., Schlipf, D., & Cheng, P. W. (2021). 
+            Parameterization of wind evolution using lidar. 
+            Wind Energy Science, 6(1), 61–91. 
+            https://doi.org/10.5194/wes-6-61-2021
+       The GPR models are trained with measurement data from an onshore flat site.
+       Due to the limitation of the training data, it is not recommended to 
+       use the GPR models for the cases where the separations between the unfrozen planes exceed 109 m.
+    -------------------------------------------------------------------------------------------------------------    
       
     """
     
-    ConfigParameters['EvoModel']        = 'Exp-Simley'; # 'Exp-UserDefined', 'Exp-Simley',  'Kristensen'     
+    ConfigParameters['EvoModel']        = 'Exp-Simley'; # 'Exp-UserDefined', 'Exp-Simley', 'Exp-GPR', 'Kristensen'     
+    
+    # the models of UserConfig select the model parameters below, e.g. in a parameter sweep
+    UserConfig = dict(UserConfig or {})
+    for key in ['TurbModel','EvoModel']:
+        if key in UserConfig:
+            ConfigParameters[key] = UserConfig[key]
     
     """define wind evolution parameters for the model 'Exp-UserDefined'
     equation => cohx = math.exp(-a*math.sqrt((f*dx/U)**2+(b*dx)**2))
@@ -96,6 +116,11 @@ def TurbConfig():
         ConfigParameters['evo_a']             = 1             # Longitudinal coherence decay parameter  
         ConfigParameters['evo_b']             = 0             # Longitudinal coherence decay offset parameter
             
+    """the GPR models of the model 'Exp-GPR' (.mat file of the matlab version), they are read once per process.
+    Or you may leave it empty, then evoTurb_matlab/GPR models/ExpGPR.mat of this repository is used"""
+    if ConfigParameters['EvoModel']=='Exp-GPR':
+        ConfigParameters['GPRModel']          = ''
+            
     """If you pick other wind evolution models except 'Exp-UserDefined' when using Mann model
     please adjust the following variables for calculating the wind evolution model parameters"""     
     if ConfigParameters['EvoModel']!='Exp-UserDefined' and ConfigParameters['TurbModel']=='Mann':
@@ -104,7 +129,85 @@ def TurbConfig():
         ConfigParameters['sigma_w']           = 2            # standard deviation of w component [m/s] 
         ConfigParameters['L_u']               = 340          # integral length scale of u component [m] 
 
+    """    
+    ---- Please modify the following user-defined configurations for the performance options -----------------------
+    """
+    
+    """map the 3D wind fields (.wnd or .bin) instead of reading them into the memory.
+    The data is only read, scaled, and flipped when it is indexed."""
+    ConfigParameters['LazyImport']      = False
+    
+    """generator of the 3D wind fields: 'exe' runs TurbSim or MTG (exeDir), 'native' simulates 
+    the Kaimal model (IEC 61400-1, Veers method) or the Mann model (spectral tensor) in python 
+    without any 3D file, see #Simulate3DTurb.py#. The parameters are read from the TurbSim or 
+    MTG input file. With Save3D, the native 3D wind fields are also saved in saveDir_3D"""
+    ConfigParameters['Backend3D']       = 'exe'
+    ConfigParameters['Save3D']          = False
+    
+    """number of 3D wind fields read in parallel by #Import3DTurb.py#, None = number of CPU cores"""
+    ConfigParameters['NumWorkersImport'] = None
+    
+    """number of TurbSim or MTG runs in parallel, None = number of CPU cores,
+    the time limit of each run [s], None = no limit, 
+    and the number of retries if a run fails or exceeds the time limit"""
+    ConfigParameters['NumWorkers3D']    = None
+    ConfigParameters['SimTimeout']      = None
+    ConfigParameters['SimRetries']      = 1
+    
+    """directory of a content-addressed store of 3D wind fields shared by several projects,
+    None = the 3D wind fields are saved in the 3DTurb folder of this project. Each field is keyed 
+    by the generator input, the .exe file and the seed, and the least recently used fields are 
+    deleted if the store exceeds Store3DSize [bytes]. If Store3DVerify is True, the checksums 
+    of the files are checked before a field is reused, otherwise only their sizes"""
+    ConfigParameters['Store3D']         = None
+    ConfigParameters['Store3DSize']     = 50e9
+    ConfigParameters['Store3DVerify']   = False
+    
+    """cache the Cholesky factors of the longitudinal coherence on the disk for later runs 
+    with the same Xpos, frequencies, Uref and wind evolution model,
+    and the maximum size of the cache [bytes], the least recently used factors are deleted first.
+    The cache is always used by #Sweep.py#"""
+    ConfigParameters['CohxCache']       = False
+    ConfigParameters['CohxCacheSize']   = 2e9
+    
+    """factorize the longitudinal coherence of evenly spaced planes as a Toeplitz matrix (Schur algorithm) 
+    from the coherence to the first plane instead of the dense Cholesky decomposition of the full matrix,
+    e.g. for many closely spaced planes, see #CalcHx.py#"""
+    ConfigParameters['ToeplitzCohx']    = True
+    
+    """approximate memory budget for the turbulence unfreezing [bytes], None = unlimited.
+    If it is set, the 3D wind fields are mapped (see LazyImport), the grid points are unfreezed 
+    block by block, and the u (and w for Mann) components of the 4D wind field are 
+    memory-mapped .npy files in a temporary folder of the 4DTurb folder, which is removed 
+    after the export"""
+    ConfigParameters['MemoryBudget']    = None
+    
+    """keep the memory-mapped u (and w) components of a memory budget in the 4DTurb folder 
+    as '<SimulationName4D>_U.npy' (and '_W.npy'), about 4 times the size of the .evo file"""
+    ConfigParameters['Keep4DArrays']    = False
+    
+    """save the Fourier coefficients of each 3D wind field in the 4DTurb folder, they are reused 
+    by #Append4DTurb.py# to add unfrozen planes without recalculating the existing ones"""
+    ConfigParameters['SaveSpectra']     = False
+    
+    """numerical precision of the import, FFT and mixing: 'double' (float64) or 'single' (float32),
+    the .evo file is quantised to int16 in both cases. If PrecisionCheck is True, a few grid points 
+    are recalculated in double precision and the deviation is printed in int16 quantisation steps"""
+    ConfigParameters['Precision']       = 'double'
+    ConfigParameters['PrecisionCheck']  = True
+    
+    """record the wall time, CPU time, and peak memory of each stage and sub-step (3D simulations,
+    plane import, coherence, Cholesky decomposition, FFT, mixing, iFFT, quantisation, and writing)
+    in the report saveDir_4D/<SimulationName4D>_timing.json, see #StageTimer.py#. ProfilerHook: None,
+    a function hook(Name,Event) or its name 'module.function' called at the start and stop of 
+    each stage, or 'cProfile' to save the statistics of the whole run as *_timing.prof"""
+    ConfigParameters['Timing']          = False
+    ConfigParameters['ProfilerHook']    = None
+    
     """------ End of the user-defined configurations --------------------------- """   
+    
+    # replace the user-defined configurations, e.g. in a parameter sweep
+    ConfigParameters.update(UserConfig)
         
     # obtain derived parameters 
     
@@ -112,6 +215,9 @@ def TurbConfig():
         
         # read variables from the TurbSim input file
         ConfigParameters = ReadTurbSimInput(ConfigParameters)
+        for key in ['Uref','TurbClass','WindType']:
+            if key in UserConfig:
+                ConfigParameters[key] = UserConfig[key]
     
         # Number of time steps [-]
         ConfigParameters['Nt'] = ConfigParameters['Time']/ConfigParameters['dt']         
@@ -154,14 +260,18 @@ def TurbConfig():
         ConfigParameters['saveDir_3D'] = os.path.join(os.getcwd(),'3DTurb_' + ConfigParameters['TurbModel'])
         ConfigParameters['saveDir_4D'] = os.path.join(os.getcwd(),'4DTurb_' + ConfigParameters['TurbModel'])
         ConfigParameters['saveDir_SimInputFiles'] = os.path.join(os.getcwd(),'InputFiles_' + ConfigParameters['TurbModel'])
+        ConfigParameters['saveDir_Cache'] = os.path.join(os.getcwd(),'Cache_Cohx')
     else:
         ConfigParameters['saveDir_3D'] = os.path.join(ConfigParameters['saveDir'],'3DTurb_' + ConfigParameters['TurbModel'])
         ConfigParameters['saveDir_4D'] = os.path.join(ConfigParameters['saveDir'],'4DTurb_' + ConfigParameters['TurbModel'])
         ConfigParameters['saveDir_SimInputFiles'] = os.path.join(ConfigParameters['saveDir'],'InputFiles_' + ConfigParameters['TurbModel'])
+        ConfigParameters['saveDir_Cache'] = os.path.join(ConfigParameters['saveDir'],'Cache_Cohx')
 
     os.makedirs(ConfigParameters['saveDir_3D'], exist_ok=True)
     os.makedirs(ConfigParameters['saveDir_4D'], exist_ok=True)
     os.makedirs(ConfigParameters['saveDir_SimInputFiles'], exist_ok=True)
+    if ConfigParameters['CohxCache']:
+        os.makedirs(ConfigParameters['saveDir_Cache'], exist_ok=True)
     
 
     """check error """
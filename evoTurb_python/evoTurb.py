@@ -7,7 +7,10 @@ Usage
 0. install TurbSim or Mann turbulence generator
 1. modify input file of TurbSim (.inp) or Mann turbulence generator (.bat)
 2. modify #TurbConfig.m#
-3. run this main script
+3. run this main script: python evoTurb.py
+   or replace configurations of #TurbConfig.py# without modifying it:
+   python evoTurb.py ConfigFile.json -s Uref=12 -s "Seeds=[1,2,3]"
+   or call it from python: ConfigParameters = RunPipeline(UserConfig)
 ------------------------------------------------------------------------------
 required files
 1. the executable of TurbSim or Mann turbulence generator
@@ -27,33 +30,81 @@ Modified
 
 """
 
-# Main script
-
-# clear variables
-from IPython import get_ipython
-get_ipython().magic('reset -sf')
-
-# Load library
+# import libirary
+import argparse
+import json
+import sys
 from TurbConfig import TurbConfig 
-from Execute3DSim import Execute3DSim
-from Import3DTurb import Import3DTurb
-from Generate4DTurb import Generate4DTurb
+from Run3DTurb import Run3DTurb
+from Generate4DTurb import Generate4DTurb, RemoveScratch4D
 from Export4DTurb import Export4DTurb
+from StageTimer import StartTiming, StopTiming, Stage
+
 
-"""--------- Get Simulation Configuration File --------------------------------
-please modify TurbConfig before running this script"""
-ConfigParameters   = TurbConfig()
+def RunPipeline(UserConfig=None):
+    
+    # UserConfig: -dict or -string, configurations replacing the ones in #TurbConfig.py#,
+    #             or the name of a json file with these configurations
+    if isinstance(UserConfig,str):
+        with open(UserConfig) as f2read:
+            UserConfig = json.load(f2read)
 
-"""--------- Run 3D simulations using Mann Turbulence Generator or Turbsim ----------"""
-ConfigParameters  = Execute3DSim(ConfigParameters)    
+    """--------- Get Simulation Configuration File --------------------------------
+    please modify TurbConfig or give UserConfig before running this script"""
+    ConfigParameters   = TurbConfig(UserConfig)
+    
+    # record the time and memory of each stage if ConfigParameters['Timing'] is True,
+    # the timing is also stopped if a stage fails
+    StartTiming(ConfigParameters)
+    try:
+        
+        """--------- Run 3D simulations using Mann Turbulence Generator or Turbsim ----------
+        and import the 3D wind fields with different seeds, the native generator hands 
+        them over in memory (see #Run3DTurb.py#)"""
+        TurbData3D, ConfigParameters = Run3DTurb(ConfigParameters)  
+        
+        """--------- Generate 4D turbulence with 3D wind fields of different seeds -------------"""
+        with Stage('Generate4DTurb'):
+            TurbData4D, ConfigParameters = Generate4DTurb(ConfigParameters,TurbData3D)  
+        del TurbData3D
+        
+        """--------- Export the 4D wind field to Bladed style binary file --------------"""
+        with Stage('Export4DTurb'):
+            Export4DTurb(ConfigParameters,TurbData4D) 
+        
+        # remove the temporary 4D arrays of a memory budget
+        del TurbData4D
+        RemoveScratch4D(ConfigParameters)
+        
+    finally:
+        StopTiming(ConfigParameters)
+    
+    print('4D wind field generation finished!')
+    return ConfigParameters
 
-"""--------- Import 3D wind fields with different seeds --------------"""
-TurbData3D, ConfigParameters = Import3DTurb(ConfigParameters)  
 
-"""--------- Generate 4D turbulence with 3D wind fields of different seeds -------------"""
-TurbData4D, ConfigParameters = Generate4DTurb(ConfigParameters,TurbData3D)  
+def main(argv=None):
+    
+    parser = argparse.ArgumentParser(description='Generate a 4D wind field with evoTurb.')
+    parser.add_argument('ConfigFile',nargs='?',default=None,
+                        help='json file with configurations replacing the ones in TurbConfig.py')
+    parser.add_argument('-s','--set',action='append',default=[],metavar='KEY=VALUE',
+                        help='replace one configuration, the value is read as json if possible, e.g. -s Uref=12 -s "Seeds=[1,2,3]"')
+    args = parser.parse_args(argv)
+    
+    UserConfig = {}
+    if args.ConfigFile:
+        with open(args.ConfigFile) as f2read:
+            UserConfig = json.load(f2read)
+    for item in args.set:
+        key,_,value = item.partition('=')
+        try:
+            UserConfig[key] = json.loads(value)
+        except ValueError:
+            UserConfig[key] = value
+    
+    RunPipeline(UserConfig)
 
-"""--------- Export the 4D wind field to Bladed style binary file --------------"""
-Export4DTurb(ConfigParameters,TurbData4D) 
 
-print('4D wind field generation finished!')
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,6 +10,8 @@ source: https://github.com/old-NWTC/TurbSim/blob/master/CertTest/readBLgrid.m
 --------------------------------------------------------------------------------------
 Usage
 velocity, y, z, nz, ny, dz, dy, dt, zHub, z1, SummVars,Scale,Offset = readBLgrid(FileName)
+velocity, Scale, Offset = mapBLgrid(FileName)
+Header = readBLgridHeader(FileName)
 ------------------------------------------------------------------------------------------
 Inputs
 FileName       - string, the name of the file to open (.wnd extension is optional)
@@ -27,6 +29,11 @@ z1             - vertical location of bottom of grid [m above ground level]
 SumVars        - variables from the summary file (zHub, Clockwise, UBAR, TI_u, TI_v, TI_w)
 Scale          - a scale factor to write out binary data
 Offset         - an offset to write out binary data
+Header         - dict, the header of the binary file and the summary file, 
+                 including the byte offset of the grid data ['DataOffset']
+mapBLgrid returns velocity as a read-only memory-mapped int16 view 
+(time, velocity component, iy, iz) without scaling, i.e.
+velocity*Scale+Offset equals the velocity of readBLgrid
 --------------------------------------------------------------------------------------------
 Created on 18.06.2021 
 Feng Guo      (c) Flensburg University of Applied Sciences
@@ -38,7 +45,7 @@ import numpy as np
 import os
 
 
-def readBLgrid(FileName):
+def readBLgridHeader(FileName):
     
     length    = len(FileName);                          # avoid using len 
     ending    = FileName[length-4:length]
@@ -206,51 +213,68 @@ def readBLgrid(FileName):
     
     
     #-----------------------------------------
-    #READ THE GRID DATA FROM THE BINARY FILE
-    #-----------------------------------------                   
-    print('Reading and scaling the grid data...')
-    
-    # nffc     = 3;
-    nv       = nffc*ny*nz;               # the size of one time step
+    #SCALING FACTORS OF THE GRID DATA
+    #-----------------------------------------
     Scale    = 0.00001*SummVars[2]*SummVars[3:6]
     Offset   = np.zeros((3, 1))
     Offset[0]   = SummVars[2]
     Offset[1]   = 0
     Offset[2]   = 0
     
+    # the grid data starts right after the header
+    DataOffset = fid_wnd.tell()
+    
+    #close the file io
+    fid_wnd.close()
+    
+    Header = {'FileName': FileName, 'nffc': int(nffc), 'nt': int(nt), 'ny': int(ny), 'nz': int(nz),
+              'dz': dz, 'dy': dy, 'dt': dt, 'ZGoffset': ZGoffset, 'SummVars': SummVars,
+              'Scale': Scale, 'Offset': Offset, 'DataOffset': DataOffset}
+    
+    return Header
+
+
+def readBLgrid(FileName):
+    
+    Header   = readBLgridHeader(FileName)
+    nffc     = Header['nffc']
+    nt       = Header['nt']
+    ny       = Header['ny']
+    nz       = Header['nz']
+    dz       = Header['dz']
+    dy       = Header['dy']
+    dt       = Header['dt']
+    SummVars = Header['SummVars']
+    Scale    = Header['Scale']
+    Offset   = Header['Offset']
+    
+    #-----------------------------------------
+    #READ THE GRID DATA FROM THE BINARY FILE
+    #-----------------------------------------                   
+    print('Reading and scaling the grid data...')
     
+    nv       = nffc*ny*nz;               # the size of one time step
     
-    velocity = np.zeros((int(nt),int(nffc),int(ny),int(nz)))
+    fid_wnd  = open(Header['FileName'] + '.wnd', 'rb')
+    fid_wnd.seek(Header['DataOffset'])
+    
+    # read all time steps of the grid in one go, the records are stored as 
+    # time step x iz x iy x velocity component in the binary file
+    v       = np.fromfile(fid_wnd,dtype=np.int16,count = int(nv*nt))
+    cnt     = len(v)
+    if cnt < nv*nt:
+        fid_wnd.close()
+        raise ValueError('Could not read entire file: at grid record '+ str(int(cnt))+' of '+str(int(nv*nt)))
+    
+    # reshape to (time, component, iy, iz) and scale with broadcasting
+    v        = np.transpose(np.reshape(v,(int(nt),int(nz),int(ny),int(nffc))),(0,3,2,1))
     
     if SummVars[1] > 0:        #clockwise rotation
         #flip the y direction....
-        #let's change the dimension of velocity so that it's 4-d instead of 3-d   
-        y_ix = list(range(int(ny),0,-1))
-    else:
-        y_ix = list(range(0,int(ny)+1,1))
-    
-    
-    # [v cnt] = fread( fid_wnd, nv, fileFmt );
-    # if cnt < nv
-    #     error(['Could not read entire file: at grid record ' num2str( (it-1)*nv+cnt2 ) ' of ' num2str(nrecs)]);
-    # end
-    # disp('Scaling the grid data...');
-    
-    
-    for it in range(1,int(nt)+1):
-        
-        v       = np.fromfile(fid_wnd,dtype=np.int16,count = int(nv))
-        cnt     = len(v)
-        if cnt < nv:
-            print('Could not read entire file: at grid record '+ int( (it-1)*nv+cnt )+' of '+int(nv*nt))
-        
-        cnt2 = 1;
-        for iz in range(1,int(nz)+1):
-            for iy in range(int(y_ix[0]),int(y_ix[-1])-1,-1):
-                for k in range(1,int(nffc)+1):
-                    velocity[it-1,k-1,iy-1,iz-1] = v[cnt2-1]*Scale[k-1] + Offset[k-1]
-                    cnt2 = cnt2 + 1;
-                    
+        v    = v[:,:,::-1,:]
+    
+    velocity = v*np.reshape(Scale,(1,-1,1,1)) + np.reshape(Offset,(1,-1,1,1))
+    del v
     
     
     #close the file io
@@ -258,9 +282,28 @@ def readBLgrid(FileName):
     
     y    = range(0,int(ny))*dy - dy*(ny-1)/2
     zHub = SummVars[0];
-    z1   = zHub - ZGoffset - dz*(nz-1)/2  #this is the bottom of the grid
+    z1   = zHub - Header['ZGoffset'] - dz*(nz-1)/2  #this is the bottom of the grid
     z    = range(0,int(ny))*dz + z1;
     
     print('Finished.');
 
-    return velocity, y, z, nz, ny, dz, dy, dt, zHub, z1, SummVars,Scale,Offset
\ No newline at end of file
+    return velocity, y, z, nz, ny, dz, dy, dt, zHub, z1, SummVars,Scale,Offset
+
+
+def mapBLgrid(FileName):
+    
+    Header   = readBLgridHeader(FileName)
+    
+    # map the grid data without reading it, the records are stored as 
+    # time step x iz x iy x velocity component in the binary file
+    v        = np.memmap(Header['FileName'] + '.wnd', dtype=np.int16, mode='r', offset=Header['DataOffset'],
+                         shape=(Header['nt'],Header['nz'],Header['ny'],Header['nffc']))
+    
+    # view as (time, component, iy, iz), no data is copied
+    velocity = np.transpose(v,(0,3,2,1))
+    
+    if Header['SummVars'][1] > 0:        #clockwise rotation
+        #flip the y direction....
+        velocity = velocity[:,:,::-1,:]
+    
+    return velocity, Header['Scale'], Header['Offset']
\ No newline at end of file
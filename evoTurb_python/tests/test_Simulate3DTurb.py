@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+test_Simulate3DTurb
+tests of the native 3D generators of #Simulate3DTurb.py#
+------------------------------------------------------------------------------------
+Usage
+python -m pytest evoTurb_python/tests
+----------------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+----------------------------------------------------------------------------------------------------
+Modified
+
+"""
+
+# import libirary
+import contextlib
+import io
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from ReadMTGInput import ReadMTGInput
+from Simulate3DTurb import SimulateMann
+
+# the MTG example of the matlab version: 8x8 grid points with 4 m spacing and L = 61 m
+ExampleMTG = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','..','evoTurb_matlab','example','MannTurbInputFileCohTest.bat')
+
+
+def test_MannVariances():
+
+    # the grid is smaller than the length scale, the variances are dominated by the
+    # cells near the origin and w must still have the smallest variance
+    ConfigParameters = ReadMTGInput({'SimInitialInputDir': ExampleMTG})
+    ConfigParameters.update({'Nt': 1024,'Nplanes': 4,'Seeds': [1,2,3,4]})
+    with contextlib.redirect_stdout(io.StringIO()):
+        TurbData3D,_ = SimulateMann(ConfigParameters)
+
+    for i in range(ConfigParameters['Nplanes']):
+        sigma_u,sigma_v,sigma_w = [np.std(TurbData3D[comp][:,:,:,i]) for comp in ['U','V','W']]
+        assert sigma_u > sigma_v > sigma_w
+        assert 1 < sigma_u < 3
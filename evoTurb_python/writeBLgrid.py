@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+writeBLgrid
+function: write a 3D wind field as a Turbsim '.wnd' binary file and '.sum' summary file
+------------------------------------------------------------------------------------
+The format is the newer-style AeroDyn/Bladed full-field file written by TurbSim,
+see #readBLgrid.py#.
+--------------------------------------------------------------------------------------
+Usage
+Scale, Offset = writeBLgrid(FileName, velocity, dz, dy, dt, zHub, Clockwise, Scale, Offset)
+Scale, Offset = BLgridScale(u, v, w)
+------------------------------------------------------------------------------------------
+Inputs
+FileName      - string, the name of the files without extension
+velocity      - 4-D array: time, velocity component, iy, iz (as returned by readBLgrid)
+dz, dy, dt    - scalars: distance between two points in the vertical [m]/
+                horizontal [m]/time [s] dimension
+zHub          - hub height [m]
+Clockwise     - bool, clockwise rotation looking downwind, the y direction is
+                flipped in the file as in TurbSim
+Scale, Offset - optional, the scale factor and offset of the binary data, e.g. of a
+                4D wind field, by default calculated with BLgridScale
+u, v, w       - arrays of the three velocity components of any size
+-----------------------------------------------------------------------------------------
+Outputs
+FileName.wnd, FileName.sum
+Scale          - the scale factor of the binary data, 0.00001*mean u*TI [%]
+Offset         - the offset of the binary data, mean u for the u component
+The velocity is quantised to int16 with Scale and Offset, the mean wind speed and
+turbulence intensities are stored in the header
+--------------------------------------------------------------------------------------------
+Created on 18.10.2026
+Yiyin Chen    (c) University of Stuttgart
+Feng Guo      (c) Flensburg University of Applied Sciences
+"""
+
+# import libirary
+import numpy as np
+
+
+def writeBLgrid(FileName, velocity, dz, dy, dt, zHub, Clockwise=True, Scale=None, Offset=None):
+
+    nt, nffc, ny, nz = np.shape(velocity)
+    if nffc != 3:
+        raise ValueError('The velocity must have three components.')
+    if nt % 2:
+        raise ValueError('The number of time steps must be even, the file stores nt/2.')
+
+    if Scale is None:
+        Scale, Offset = BLgridScale(velocity[:,0], velocity[:,1], velocity[:,2])
+
+    # mean wind speed and turbulence intensities [%] stored in the header, 
+    # readBLgrid derives the scale factor and offset from them
+    MFFWS = float(Offset[0])
+    TI    = np.ravel(Scale)/(0.00001*MFFWS)
+
+    with open(FileName + '.wnd', 'wb') as fid_wnd:
+
+        np.array([-99, 4], dtype=np.int16).tofile(fid_wnd)             # newer-style file, TI stored in the header
+        np.array([nffc], dtype=np.int32).tofile(fid_wnd)                # number of components
+        # latitude, roughness length, reference height, TI of u, v, w
+        np.array([0, 0.03, zHub] + list(TI), dtype=np.float32).tofile(fid_wnd)
+        np.array([dz, dy, dt*MFFWS], dtype=np.float32).tofile(fid_wnd)   # delta z, y, x in m
+        np.array([nt//2], dtype=np.int32).tofile(fid_wnd)               # half the number of time steps
+        np.array([MFFWS, 0, 0, 0], dtype=np.float32).tofile(fid_wnd)    # mean wind speed, unused variables
+        np.array([0, 0, nz, ny] + [0]*3*(nffc-1), dtype=np.int32).tofile(fid_wnd)
+
+        if Clockwise:
+            velocity = velocity[:,:,::-1,:]
+
+        # the records are stored as time step x iz x iy x velocity component,
+        # quantised in blocks of time steps
+        for it in range(0, nt, 1024):
+            v = (velocity[it:it+1024] - np.reshape(Offset,(1,-1,1,1)))/np.reshape(Scale,(1,-1,1,1))
+            v = np.clip(np.rint(v), -32768, 32767).astype(np.int16)
+            np.transpose(v,(0,3,2,1)).tofile(fid_wnd)
+
+    # the summary variables read by readBLgrid
+    with open(FileName + '.sum', 'w') as fid_sum:
+        fid_sum.write('This summary file was generated by writeBLgrid.\n\n')
+        fid_sum.write('   {0}       Clockwise rotation looking downwind?\n'.format('T' if Clockwise else 'F'))
+        fid_sum.write('  {0:.3f}   Hub height [m]\n'.format(zHub))
+        fid_sum.write('\nGrid Base Height Offset = 0.0 m\n')
+
+    return Scale, Offset
+
+
+def BLgridScale(u, v, w):
+
+    # scale factor and offset as in TurbSim: 0.00001*mean u*TI [%], a zero 
+    # intensity would make the scale factor zero. The mean wind speed and the 
+    # intensities are rounded to float32 as in the header of the .wnd file, so 
+    # readBLgrid returns the same values
+    MFFWS = float(np.float32(np.mean(u)))
+    TI    = np.float32(np.maximum(100*np.array([np.std(u), np.std(v), np.std(w)])/MFFWS, 1e-3)).astype(np.float64)
+
+    Scale     = np.reshape(0.00001*MFFWS*TI,(3,1))
+    Offset    = np.zeros((3, 1))
+    Offset[0] = MFFWS
+
+    return Scale, Offset